@@ -9,70 +9,120 @@ from shiny.express import input, module, render, ui
 from shiny.types import FileInfo
 from shiny.ui import page_navbar
 from shinyswatch import theme
-from shinywidgets import render_altair, render_widget
-
+from shinywidgets import reactive_read, render_altair, render_widget
+
+from data import (
+    BACKEND,
+    BACKEND_COMPARE,
+    CHUNKED_INGEST_BYTES,
+    STORE,
+    add_calendar,
+    build_cube,
+    build_digests,
+    build_rollups,
+    cache_path,
+    category_contains,
+    load_cached,
+    partition_results,
+    raw_size,
+    read_files,
+    read_files_chunked,
+    sort_by_partition,
+    store_cached,
+    take_partition,
+    upload_key,
+)
 from icons import gear_fill
 from plots import (
+    HAS_VL_CONVERT,
+    STATIC_CHART_MIN_ROWS,
+    ZOOM_PARAM,
+    calculate_statistics,
     chart_error_line,
     chart_total_bar,
     chart_total_line,
     chart_total_stacked_area,
+    compare_results,
+    downsample_minmax,
     prep_chart_data,
+    static_chart,
     title_case,
     var_to_none,
 )
 
+# Optional query backends that run the resource time series charts straight
+# from the uploaded files
+if BACKEND == "polars":
+    from backends import lazy as backend
+elif BACKEND == "duckdb":
+    from backends import sql as backend
+else:
+    backend = None
 
-def add_hour_of_day_and_month(df: pd.DataFrame) -> pd.DataFrame:
-    "Assume all rows have a valid time value from 1-8760"
-    # Add 'hour_of_day': hours go from 0 to 23, so we use (time-1) % 24
-    df["hour_of_day"] = ((df["time"] - 1) % 24).astype(int)
 
-    # Calculate the day of the year (1-365)
-    day_of_year = (df["time"] - 1) // 24 + 1
+def add_cap_type(df: pd.DataFrame) -> pd.DataFrame:
+    df["capacity_type"] = "Total"
+    df.loc[category_contains(df["variable"], "new"), "capacity_type"] = "New"
+    df.loc[category_contains(df["variable"], "ret"), "capacity_type"] = "Retired"
+    return df
 
-    # Define month boundaries (non-leap year)
-    month_boundaries = [0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334, 365]
 
-    # Map 'day_of_year' to 'month' (1-12)
-    df["month"] = day_of_year.apply(
-        lambda day: next(
-            month
-            for month, boundary in enumerate(month_boundaries[1:], start=1)
-            if day <= boundary
-        )
-    )
+async def chart_or_image(chart: alt.TopLevelMixin, data: pd.DataFrame):
+    """`chart`, or a server-rendered image of it when its data is too heavy for
+    the browser and the user hasn't switched to interactive charts"""
+    if (
+        not HAS_VL_CONVERT
+        or len(data) <= STATIC_CHART_MIN_ROWS
+        or input.interactive_charts()
+    ):
+        return chart
+    return await static_chart(chart)
 
-    return df
 
+@reactive.calc
+def ingest():
+    file: list[FileInfo] | None = input.results_files()
 
-def add_cap_type(df: pd.DataFrame) -> pd.DataFrame:
-    df["capacity_type"] = "Total"
-    df.loc[df["variable"].str.contains("new"), "capacity_type"] = "New"
-    df.loc[df["variable"].str.contains("ret"), "capacity_type"] = "Retired"
-    return df
+    if file is None or not file:
+        return pd.DataFrame(), {}
+    fns = [f["datapath"] for f in file]
+    key = upload_key(fns)
+    df = load_cached(key)
+    positions = None
+    if df is None:
+        if sum(raw_size(fn) for fn in fns) > CHUNKED_INGEST_BYTES:
+            df, positions = read_files_chunked(fns)
+        else:
+            df = read_files(fns)
+        if STORE == "arrow":
+            # Derived tables become slices of the shared, memory-mapped copy
+            df = sort_by_partition(df)
+            positions = None
+        if store_cached(key, df) and STORE == "arrow":
+            df = load_cached(key)
+    if positions is None:
+        positions = partition_results(df)
+    return add_calendar(df), positions
 
 
-def read_file(fn) -> pd.DataFrame:
-    if Path(fn).suffix in [".parquet", ".pq"]:
-        return pd.read_parquet(fn).dropna(how="all")
-    else:
-        return pd.read_csv(fn).dropna(how="all")
+@reactive.calc
+def parsed_file():
+    return ingest()[0]
 
 
 @reactive.calc
-def parsed_file():
-    cat_cols = ["model", "scenario", "region", "variable", "type"]
+def capacity_file():
     file: list[FileInfo] | None = input.results_files()
 
     if file is None or not file:
         return pd.DataFrame()
-    df = pd.concat([read_file(f["datapath"]) for f in file])
-    for col in cat_cols:
-        df[col] = df[col].astype("category")
-    df["time"] = df["time"].astype("float32")
-    df["year"] = df["year"].astype(str)
-    return df
+    fns = [f["datapath"] for f in file]
+    # Parquet reads skip the time series rows, so the capacity tabs never load them
+    if all(Path(fn).suffix in [".parquet", ".pq"] for fn in fns):
+        return read_files(fns, filters=[("time", "is null")])
+    if backend is not None:
+        return backend.to_pandas(backend_table("capacity"))
+    return take_partition(parsed_file(), partitions()["capacity"])
 
 
 ui.page_opts(title="Explore model results", fillable=True, theme=theme.yeti)
@@ -96,6 +146,24 @@ with ui.sidebar(id="user_data_sidebar_left"):
             multiple=True,
         )
         "Select one or more data files. All files must be selected at the same time."
+    if HAS_VL_CONVERT:
+        with ui.tooltip(id="interactive_charts_tooltip"):
+            ui.input_switch("interactive_charts", "Interactive charts", value=False)
+            (
+                f"Charts of more than {STATIC_CHART_MIN_ROWS:,} rows are drawn on the"
+                " server as images. Switch on to pan, zoom and hover them in the"
+                " browser instead."
+            )
+
+
+@reactive.calc
+def partitions():
+    return ingest()[1]
+
+
+@reactive.calc
+def capacity_partitions():
+    return partition_results(capacity_file())
 
 
 @reactive.calc
@@ -103,21 +171,17 @@ def filter_data():
     if parsed_file().empty:
         return parsed_file()
     elif input.data_type() == "Capacity":
-        return parsed_file().query("time.isna()")
+        return take_partition(parsed_file(), partitions()["capacity"])
     else:
-        return parsed_file().query("time.notna()")
+        return take_partition(parsed_file(), partitions()["time"])
 
 
 @reactive.calc
 def tx_cap_data():
-    if parsed_file().empty:
-        return parsed_file()
+    if capacity_file().empty:
+        return capacity_file()
     else:
-        return (
-            parsed_file()
-            .query("time.isna() and type == 'PowerLine'")
-            .pipe(add_cap_type)
-        )
+        return capacity_file().take(capacity_partitions()["tx_cap"]).pipe(add_cap_type)
 
 
 @reactive.calc
@@ -125,37 +189,74 @@ def tx_time_data():
     if parsed_file().empty:
         return parsed_file()
     else:
-        return (
-            parsed_file()
-            .query("time.notna() and type == 'PowerLine'")
-            .pipe(add_hour_of_day_and_month)
-        )
+        return take_partition(parsed_file(), partitions()["tx_time"])
 
 
 @reactive.calc
 def resource_cap_data():
-    if parsed_file().empty:
-        return parsed_file()
+    if capacity_file().empty:
+        return capacity_file()
     else:
         return (
-            parsed_file()
-            .query("time.isna() and type != 'PowerLine'")
+            capacity_file()
+            .take(capacity_partitions()["resource_cap"])
             .pipe(add_cap_type)
         )
 
 
+@reactive.calc
+def r_cap_cube():
+    return build_cube(resource_cap_data())
+
+
 @reactive.calc
 def resource_time_data():
     if parsed_file().empty:
         return parsed_file()
     else:
-        return (
-            parsed_file()
-            .query(
-                "time.notna() and type != 'PowerLine' and unit == 'MWh' and variable.str.contains('flow')"
-            )
-            .pipe(add_hour_of_day_and_month)
-        )
+        return take_partition(parsed_file(), partitions()["resource_time"])
+
+
+@reactive.calc
+def results_db():
+    fns = [f["datapath"] for f in input.results_files()]
+    # Sessions uploading the same files share one database file in the cache
+    database = cache_path(upload_key(fns), ".duckdb")
+    return backend.connect(fns, database=database)
+
+
+def backend_table(name: str):
+    "Unmaterialized derived table `name` of the query backend"
+    if BACKEND == "duckdb":
+        return results_db().view(name)
+    fns = [f["datapath"] for f in input.results_files()]
+    return backend.with_calendar(
+        backend.scan_files(fns).filter(backend.partition_exprs()[name])
+    )
+
+
+@reactive.calc
+def r_time_query():
+    # Unmaterialized resource_time_data for the query backends
+    return backend_table("resource_time")
+
+
+@reactive.calc
+def r_time_empty():
+    if backend is None:
+        return parsed_file().empty
+    # The query backends count rows instead of loading the files
+    return not input.results_files() or backend.count_rows(r_time_query()) == 0
+
+
+@reactive.calc
+def r_time_rollups():
+    return build_rollups(resource_time_data())
+
+
+@reactive.calc
+def r_time_digests():
+    return build_digests(resource_time_data())
 
 
 @reactive.calc
@@ -163,13 +264,7 @@ def storage_time_data():
     if parsed_file().empty:
         return parsed_file()
     else:
-        return (
-            parsed_file()
-            .query(
-                "time.notna() and type != 'PowerLine' and variable.str.contains('storage_level')"
-            )
-            .pipe(add_hour_of_day_and_month)
-        )
+        return take_partition(parsed_file(), partitions()["storage_time"])
 
 
 @reactive.calc
@@ -177,19 +272,17 @@ def co2_time_data():
     if parsed_file().empty:
         return parsed_file()
     else:
-        return parsed_file().query(
-            "time.notna() and type != 'PowerLine' and unit == 't'"
-        )
+        return take_partition(parsed_file(), partitions()["co2_time"])
 
 
 @reactive.calc
 def r_cap_values():
     values = {}
     for col in ["year", "scenario", "region", "type", "capacity_type"]:
-        if parsed_file().empty:
+        if capacity_file().empty:
             options = ["all"]
         else:
-            options = list(resource_cap_data()[col].unique())
+            options = list(r_cap_cube()[col].unique())
         values[col] = options
     return values
 
@@ -198,8 +291,10 @@ def r_cap_values():
 def r_time_values():
     values = {}
     for col in ["year", "scenario", "region", "type"]:
-        if parsed_file().empty:
+        if r_time_empty():
             options = ["all"]
+        elif backend is not None:
+            options = backend.distinct_values(r_time_query(), col)
         else:
             options = list(resource_time_data()[col].unique())
         values[col] = options
@@ -213,7 +308,7 @@ with ui.nav_panel("Resource capacity"):
 
             @render.ui
             def r_calc_filters():
-                if not parsed_file().empty:
+                if not capacity_file().empty:
                     filters = []
                     for k, v in r_cap_values().items():
                         filters.append(
@@ -227,10 +322,8 @@ with ui.nav_panel("Resource capacity"):
                         )
                     return filters
 
-            @reactive.calc
-            def filtered_r_cap_data():
-                df = resource_cap_data()
-                df = df.loc[
+            def filter_r_cap(df: pd.DataFrame) -> pd.DataFrame:
+                return df.loc[
                     (df["year"].isin(input.r_cap_year()))
                     & (df["scenario"].isin(input.r_cap_scenario()))
                     & (df["region"].isin(input.r_cap_region()))
@@ -238,7 +331,15 @@ with ui.nav_panel("Resource capacity"):
                     & (df["type"].isin(input.r_cap_type())),
                     :,
                 ]
-                return df
+
+            @reactive.calc
+            def filtered_r_cap_data():
+                # Charts aggregate, so they start from the pre-aggregated cube
+                return filter_r_cap(r_cap_cube())
+
+            @reactive.calc
+            def filtered_r_cap_rows():
+                return filter_r_cap(resource_cap_data())
 
         with ui.navset_card_pill(id="r_cap"):
             with ui.nav_panel("Line plot"):
@@ -349,8 +450,8 @@ with ui.nav_panel("Resource capacity"):
                         ).to_csv()
 
                 @render_altair
-                def alt_cap_lines():
-                    if parsed_file().empty:
+                async def alt_cap_lines():
+                    if capacity_file().empty:
                         return None
                     data = prep_chart_data(
                         filtered_r_cap_data(),
@@ -375,7 +476,7 @@ with ui.nav_panel("Resource capacity"):
                             input.r_cap_dash(),
                         ],
                     )
-                    return chart
+                    return await chart_or_image(chart, data)
 
             with ui.nav_panel("Bar plot"):
                 "Select chart variables"
@@ -468,8 +569,8 @@ with ui.nav_panel("Resource capacity"):
                         ).to_csv()
 
                 @render_altair
-                def alt_cap_bars():
-                    if parsed_file().empty:
+                async def alt_cap_bars():
+                    if capacity_file().empty:
                         return None
                     data = prep_chart_data(
                         filtered_r_cap_data(),
@@ -492,13 +593,13 @@ with ui.nav_panel("Resource capacity"):
                             input.r_cap_bar_color(),
                         ],
                     )
-                    return chart
+                    return await chart_or_image(chart, data)
 
             with ui.nav_panel("Table"):
 
                 @render.data_frame
                 def show_r_cap_df():
-                    if parsed_file().empty:
+                    if capacity_file().empty:
                         return None
                     # data = prep_chart_data(
                     #     filtered_r_cap_data(),
@@ -509,7 +610,7 @@ with ui.nav_panel("Resource capacity"):
                     #     dash=input.r_cap_dash(),
                     #     # cap_types=input.r_cap_type(),
                     # )
-                    return render.DataTable(filtered_r_cap_data(), filters=True)
+                    return render.DataTable(filtered_r_cap_rows(), filters=True)
 
 
 with ui.nav_panel("Resource time series"):
@@ -589,7 +690,7 @@ with ui.nav_panel("Resource time series"):
 
             @render.ui
             def r_time_filters():
-                if not parsed_file().empty:
+                if not r_time_empty():
                     filters = []
                     for k, v in r_time_values().items():
                         filters.append(
@@ -688,83 +789,47 @@ with ui.nav_panel("Resource time series"):
                         label="Download plot data", filename="resource_time_data.csv"
                     )
                     def download_r_time_data():
-                        yield prep_chart_data(
-                            filtered_r_time_data(),
-                            x_var=None,  # input.cap_line_x_var(),
-                            col_var=input.r_time_col_var(),
-                            row_var=input.r_time_row_var(),
-                            color=input.r_time_color(),
-                            dash=input.r_time_dash(),
-                            avg_by=input.r_time_avg(),
-                        ).to_csv()
+                        yield r_time_avg_chart_data().to_csv()
+
+                @reactive.calc
+                def r_time_selection():
+                    return {
+                        "year": input.r_time_year(),
+                        "scenario": input.r_time_scenario(),
+                        "region": input.r_time_region(),
+                        "type": input.r_time_type(),
+                    }
+
+                def filter_r_time(df: pd.DataFrame) -> pd.DataFrame:
+                    mask = np.logical_and.reduce(
+                        [
+                            df[col].isin(values)
+                            for col, values in r_time_selection().items()
+                        ]
+                    )
+                    return df.loc[mask, :]
 
                 @reactive.calc
                 def filtered_r_time_data():
-                    df = resource_time_data()
-                    df = df.loc[
-                        (df["year"].isin(input.r_time_year()))
-                        & (df["scenario"].isin(input.r_time_scenario()))
-                        & (df["region"].isin(input.r_time_region()))
-                        & (df["type"].isin(input.r_time_type())),
-                        :,
-                    ]
-                    return df
-
-                def calculate_statistics(
-                    df: pd.DataFrame,
-                    error_method: str = "iqr",
-                    x_var="planning_year",
-                    col_var="tech_type",
-                    row_var="case",
-                    color="model",
-                ):
-                    x_var = var_to_none(x_var)
-                    col_var = var_to_none(col_var)
-                    row_var = var_to_none(row_var)
-                    color = var_to_none(color)
-
-                    by = []
-                    for var in [x_var, col_var, row_var, color]:
-                        if var is not None and var not in by:
-                            by.append(var)
-
-                    # Grouping by scenario, region, type, and hour of day
-                    grouped = df.groupby(by, observed=True)
-
-                    if error_method == "iqr":
-                        # Calculate average, IQR-based lower and upper bound
-                        stats = grouped["value"].agg(
-                            value=("mean"),
-                            low_value=lambda x: np.percentile(x, 25),
-                            high_value=lambda x: np.percentile(x, 75),
-                        )
-                    elif error_method == "std":
-                        # Calculate average, std deviation-based lower and upper bound
-                        stats = grouped["value"].agg(
-                            value=("mean"),
-                            low_value=lambda x: x.mean() - x.std(),
-                            high_value=lambda x: x.mean() + x.std(),
-                        )
-                    elif error_method == "stderr":
-                        # Calculate average, standard error-based lower and upper bound
-                        stats = grouped["value"].agg(
-                            value=("mean"),
-                            low_value=lambda x: x.mean() - x.sem(),
-                            high_value=lambda x: x.mean() + x.sem(),
-                        )
-                    else:
-                        raise ValueError(
-                            "Invalid error_method. Choose 'iqr', 'std', or 'stderr'."
-                        )
+                    return filter_r_time(resource_time_data())
 
-                    return stats.reset_index()
+                @reactive.calc
+                def filtered_r_time_rollups():
+                    return {
+                        by: filter_r_time(rollup)
+                        for by, rollup in r_time_rollups().items()
+                    }
 
-                @render_altair
-                def alt_r_time_lines():
-                    if parsed_file().empty:
-                        return None
-                    data = prep_chart_data(
-                        filtered_r_time_data(),
+                @reactive.calc
+                def filtered_r_time_digests():
+                    return {
+                        by: filter_r_time(digests)
+                        for by, digests in r_time_digests().items()
+                    }
+
+                @reactive.calc
+                def r_time_avg_chart_data():
+                    kwargs = dict(
                         x_var=None,
                         col_var=input.r_time_col_var(),
                         row_var=input.r_time_row_var(),
@@ -772,6 +837,22 @@ with ui.nav_panel("Resource time series"):
                         dash=input.r_time_dash(),
                         avg_by=input.r_time_avg(),
                     )
+                    if backend is None:
+                        rollups = filtered_r_time_rollups()[input.r_time_avg()]
+                        return prep_chart_data(rollups, **kwargs)
+
+                    query = backend.filter_isin(r_time_query(), r_time_selection())
+                    data = backend.prep_chart_data(query, **kwargs)
+                    if BACKEND_COMPARE:
+                        rollups = filtered_r_time_rollups()[input.r_time_avg()]
+                        compare_results(data, prep_chart_data(rollups, **kwargs))
+                    return data
+
+                @render_altair
+                async def alt_r_time_lines():
+                    if r_time_empty():
+                        return None
+                    data = r_time_avg_chart_data()
                     chart = chart_total_line(
                         data,
                         x_var=input.r_time_avg(),
@@ -782,7 +863,7 @@ with ui.nav_panel("Resource time series"):
                         height=200,  # * (input.cap_line_height() / 100),
                         width=200,  # * (input.cap_line_width() / 100),
                     )
-                    return chart
+                    return await chart_or_image(chart, data)
 
             with ui.nav_panel("Errobar plot"):
                 with ui.popover(placement="right", id="r_time_err_vars"):
@@ -847,7 +928,12 @@ with ui.nav_panel("Resource time series"):
                     ui.input_selectize(
                         "r_time_err_method",
                         "Error method",
-                        choices=["stderr", "std", "iqr"],
+                        choices={
+                            "stderr": "stderr",
+                            "std": "std",
+                            "iqr": "iqr",
+                            "iqr_approx": "iqr (approx)",
+                        },
                         selected="stderr",
                         width="125px",
                     )
@@ -857,27 +943,45 @@ with ui.nav_panel("Resource time series"):
                         filename="resource_time_error_data.csv",
                     )
                     def download_r_time_err_data():
-                        yield calculate_statistics(
-                            filtered_r_time_data(),
-                            error_method=input.r_time_err_method(),
-                            x_var=input.r_time_err_avg(),
-                            col_var=input.r_time_err_col_var(),
-                            row_var=input.r_time_err_row_var(),
-                            color=input.r_time_err_color(),
-                        ).to_csv()
+                        yield r_time_err_stats().to_csv()
 
-                @render_altair
-                def alt_r_time_err_errorband():
-                    if parsed_file().empty:
-                        return None
-                    data = calculate_statistics(
-                        filtered_r_time_data(),
+                @reactive.calc
+                def r_time_err_data():
+                    # Exact quantiles need the hourly values; approximate ones
+                    # come from digests and moments from rollups
+                    if input.r_time_err_method() == "iqr":
+                        return filtered_r_time_data()
+                    if input.r_time_err_method() == "iqr_approx":
+                        return filtered_r_time_digests()[input.r_time_err_avg()]
+                    return filtered_r_time_rollups()[input.r_time_err_avg()]
+
+                @reactive.calc
+                def r_time_err_stats():
+                    kwargs = dict(
                         error_method=input.r_time_err_method(),
                         x_var=input.r_time_err_avg(),
                         col_var=input.r_time_err_col_var(),
                         row_var=input.r_time_err_row_var(),
                         color=input.r_time_err_color(),
                     )
+                    if backend is None:
+                        return calculate_statistics(r_time_err_data(), **kwargs)
+
+                    query = backend.filter_isin(r_time_query(), r_time_selection())
+                    stats = backend.calculate_statistics(query, **kwargs)
+                    if BACKEND_COMPARE and kwargs["error_method"] != "iqr_approx":
+                        compare_results(
+                            stats,
+                            calculate_statistics(r_time_err_data(), **kwargs),
+                            values=["value", "low_value", "high_value"],
+                        )
+                    return stats
+
+                @render_altair
+                async def alt_r_time_err_errorband():
+                    if r_time_empty():
+                        return None
+                    data = r_time_err_stats()
                     chart = chart_error_line(
                         # filtered_r_time_err_data(),
                         data,
@@ -889,7 +993,7 @@ with ui.nav_panel("Resource time series"):
                         height=200,  # * (input.cap_line_height() / 100),
                         width=200,  # * (input.cap_line_width() / 100),
                     )
-                    return chart
+                    return await chart_or_image(chart, data)
 
             with ui.nav_panel("Hourly plot"):
                 with ui.popover(placement="right", id="r_time_hourly_vars"):
@@ -976,40 +1080,69 @@ with ui.nav_panel("Resource time series"):
                         filename="resource_time_hourly_data.csv",
                     )
                     def download_r_time_hourly_data():
-                        month = input.r_time_hourly_month()
-                        yield prep_chart_data(
-                            filtered_r_time_data(),
-                            x_var="time",  # input.cap_line_x_var(),
-                            col_var=input.r_time_hourly_col_var(),
-                            row_var=input.r_time_hourly_row_var(),
-                            color=input.r_time_hourly_color(),
-                            dash=input.r_time_hourly_dash(),
-                        ).pipe(add_hour_of_day_and_month).query(
-                            "month==@month"
-                        ).to_csv()
+                        yield hourly_r_time_chart_data().to_csv()
 
                 # @render.ui
                 # def r_time_hourly_filter():
                 ui.input_slider("r_time_hourly_month", "Month", min=1, max=12, value=1),
 
+                @reactive.calc
+                def hourly_r_time_data():
+                    df = filtered_r_time_data()
+                    return df.loc[df["month"] == input.r_time_hourly_month(), :]
+
+                @reactive.calc
+                def hourly_r_time_chart_data():
+                    kwargs = dict(
+                        x_var="time",
+                        col_var=input.r_time_hourly_col_var(),
+                        row_var=input.r_time_hourly_row_var(),
+                        color=input.r_time_hourly_color(),
+                        dash=input.r_time_hourly_dash(),
+                    )
+                    if backend is None:
+                        return prep_chart_data(hourly_r_time_data(), **kwargs)
+
+                    # One query from the files to the chart rows, run here
+                    query = backend.filter_isin(
+                        r_time_query(),
+                        {**r_time_selection(), "month": [input.r_time_hourly_month()]},
+                    )
+                    data = backend.prep_chart_data(query, **kwargs)
+                    if BACKEND_COMPARE:
+                        compare_results(
+                            data, prep_chart_data(hourly_r_time_data(), **kwargs)
+                        )
+                    return data
+
+                hourly_width = 400  # * (input.cap_line_width() / 100)
+
+                @reactive.calc
+                def hourly_r_time_thinned():
+                    # Whether the whole-month chart drops points; a month of
+                    # hours usually fits, and then zooming has nothing to add
+                    data = hourly_r_time_chart_data()
+                    stacked = input.r_time_hourly_chart_type() != "line"
+                    sampled = downsample_minmax(
+                        data, "time", hourly_width, stacked=stacked
+                    )
+                    return len(sampled) < len(data)
+
                 @render_altair
-                def alt_r_time_hourly_lines():
-                    if parsed_file().empty:
+                async def alt_r_time_hourly_lines():
+                    if r_time_empty():
                         return None
-                    month = input.r_time_hourly_month()
-                    data = (
-                        prep_chart_data(
-                            filtered_r_time_data(),
-                            x_var="time",
-                            col_var=input.r_time_hourly_col_var(),
-                            row_var=input.r_time_hourly_row_var(),
-                            color=input.r_time_hourly_color(),
-                            dash=input.r_time_hourly_dash(),
-                        )
-                        .pipe(add_hour_of_day_and_month)
-                        .query("month==@month")
+                    stacked = input.r_time_hourly_chart_type() != "line"
+                    # Every hourly point would bloat the spec; keep the
+                    # per-pixel envelope, finer inside the zoomed range
+                    data = downsample_minmax(
+                        hourly_r_time_chart_data(),
+                        "time",
+                        hourly_width,
+                        x_range=hourly_zoom(),
+                        stacked=stacked,
                     )
-                    if input.r_time_hourly_chart_type() == "line":
+                    if not stacked:
                         chart = chart_total_line(
                             data,
                             x_var="time",
@@ -1019,10 +1152,11 @@ with ui.nav_panel("Resource time series"):
                             dash=input.r_time_hourly_dash(),
                             points=False,
                             interactive_zoom=True,
+                            zoom_range=hourly_zoom(),
                             # interpolate="cardinal",
                             # tension=0.75,
                             height=200,  # * (input.cap_line_height() / 100),
-                            width=400,  # * (input.cap_line_width() / 100),
+                            width=hourly_width,
                         )
                     else:
                         chart = chart_total_stacked_area(
@@ -1032,22 +1166,56 @@ with ui.nav_panel("Resource time series"):
                             row_var=input.r_time_hourly_row_var(),
                             color=input.r_time_hourly_color(),
                             interactive_zoom=True,
+                            zoom_range=hourly_zoom(),
                             height=200,  # * (input.cap_line_height() / 100),
-                            width=400,  # * (input.cap_line_width() / 100),
+                            width=hourly_width,
                         )
-                    return chart
+                    return await chart_or_image(chart, data)
+
+                # x range the hourly chart's points were sampled for; None is
+                # the whole month
+                hourly_zoom = reactive.value(None)
+
+                @reactive.effect
+                @reactive.event(hourly_r_time_chart_data)
+                def reset_hourly_zoom():
+                    hourly_zoom.set(None)
+
+                @reactive.effect
+                def track_hourly_zoom():
+                    # Re-fetch when the user zooms into less than half of the
+                    # sampled range or pans out of it, not on every small move.
+                    # Unthinned data is already exact at any zoom, and a
+                    # re-fetch would redraw the widget and reset its view.
+                    if not hourly_r_time_thinned():
+                        return
+                    widget = alt_r_time_hourly_lines.widget
+                    if not isinstance(widget, alt.JupyterChart):
+                        # Drawn as an image, which has no zoom
+                        return
+                    selection = reactive_read(widget.selections, ZOOM_PARAM)
+                    visible = (selection.value or {}).get("time")
+                    if not visible:
+                        return
+                    with reactive.isolate():
+                        sampled = hourly_zoom()
+                        time = hourly_r_time_chart_data()["time"]
+                    lo, hi = visible
+                    if lo <= time.min() and hi >= time.max():
+                        if sampled is not None:
+                            hourly_zoom.set(None)
+                        return
+                    current = sampled or (time.min(), time.max())
+                    if (
+                        hi - lo < (current[1] - current[0]) / 2
+                        or lo < current[0]
+                        or hi > current[1]
+                    ):
+                        hourly_zoom.set((lo, hi))
 
             with ui.nav_panel("Table"):
 
                 @render.data_frame
                 def show_r_time_df():
-                    data = prep_chart_data(
-                        filtered_r_time_data(),
-                        x_var=None,
-                        col_var=input.r_time_col_var(),
-                        row_var=input.r_time_row_var(),
-                        color=input.r_time_color(),
-                        dash=input.r_time_dash(),
-                        avg_by=input.r_time_avg(),
-                    )
+                    data = r_time_avg_chart_data()
                     return render.DataTable(data, filters=True)
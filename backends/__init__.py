@@ -0,0 +1,2 @@
+# Query backends for RESULTS_BACKEND. They need polars or duckdb, which the
+# shinylive build doesn't ship, so the workflow leaves this package out of it.
@@ -0,0 +1,241 @@
+import logging
+from functools import reduce
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from data import MONTH_SEASON, RESULTS_SCHEMA, SEASONS, apply_schema, day_calendar
+from plots import FILL_MAX_ROWS, var_to_none
+
+logger = logging.getLogger(__name__)
+
+LABEL_COLUMNS = [col for col, dtype in RESULTS_SCHEMA.items() if dtype == "category"]
+
+
+def scan_files(fns: list, schema: dict = RESULTS_SCHEMA) -> pl.LazyFrame:
+    """Lazy scan of results files, typed like `data.read_files`.
+
+    Labels are strings, time and value are Float32, and NaN values become
+    nulls so aggregations skip them as pandas does. Nothing is read until the
+    plan is collected.
+    """
+    frames = [
+        (
+            pl.scan_parquet(fn)
+            if Path(fn).suffix in [".parquet", ".pq"]
+            else pl.scan_csv(fn, schema_overrides={c: pl.String for c in LABEL_COLUMNS})
+        )
+        for fn in fns
+    ]
+    lf = pl.concat(frames, how="diagonal_relaxed")
+    columns = lf.collect_schema().names()
+    lf = lf.with_columns(
+        (
+            pl.col(col).cast(pl.String)
+            if dtype == "category"
+            else pl.col(col).cast(pl.Float32).fill_nan(None)
+        )
+        for col, dtype in schema.items()
+        if col in columns
+    )
+    return lf.filter(pl.any_horizontal(pl.all().is_not_null()))
+
+
+def with_calendar(lf: pl.LazyFrame, steps_per_hour: int = 1) -> pl.LazyFrame:
+    "Lazy `data.add_calendar`, for 365-day years"
+    month, day = day_calendar(365)
+    calendar = pl.LazyFrame(
+        {
+            "_day_of_year": np.arange(365),
+            "day": day,
+            "week": ((day - 1) // 7 + 1).astype("int8"),
+            "month": month,
+            "season": pl.Series(np.array(SEASONS)[MONTH_SEASON[month - 1]]).cast(
+                pl.Enum(SEASONS)
+            ),
+        }
+    )
+    hours = ((pl.col("time").cast(pl.Float64) - 1) / steps_per_hour).floor()
+    hours = hours.cast(pl.Int64)
+    return (
+        lf.with_columns(
+            hour_of_day=(hours % 24).cast(pl.Int8),
+            _day_of_year=(hours // 24) % 365,
+        )
+        .join(calendar, on="_day_of_year", how="left")
+        .drop("_day_of_year")
+    )
+
+
+def partition_exprs() -> dict[str, pl.Expr]:
+    "Row predicates of each derived table, matching `data.partition_masks`"
+    has_time = pl.col("time").is_not_null()
+    is_line = (pl.col("type") == "PowerLine").fill_null(False)
+    is_mwh = (pl.col("unit") == "MWh").fill_null(False)
+    is_tonnes = (pl.col("unit") == "t").fill_null(False)
+    is_flow = pl.col("variable").str.contains("flow", literal=True).fill_null(False)
+    is_storage = (
+        pl.col("variable").str.contains("storage_level", literal=True).fill_null(False)
+    )
+
+    time_resource = has_time & ~is_line
+    return {
+        "capacity": ~has_time,
+        "time": has_time,
+        "tx_cap": ~has_time & is_line,
+        "tx_time": has_time & is_line,
+        "resource_cap": ~has_time & ~is_line,
+        "resource_time": time_resource & is_mwh & is_flow,
+        "storage_time": time_resource & is_storage,
+        "co2_time": time_resource & is_tonnes,
+    }
+
+
+def filter_isin(lf: pl.LazyFrame, filters: dict[str, list]) -> pl.LazyFrame:
+    "Keep rows whose value in each column of `filters` is one of the given values"
+    return lf.filter(
+        *(pl.col(col).is_in(list(values)) for col, values in filters.items())
+    )
+
+
+def count_rows(lf: pl.LazyFrame) -> int:
+    "Number of rows of `lf`, counted without materializing them"
+    return lf.select(pl.len()).collect().item()
+
+
+def distinct_values(lf: pl.LazyFrame, col: str) -> list:
+    "Non-null values of `col` in order of first appearance"
+    values = lf.select(pl.col(col).unique(maintain_order=True)).drop_nulls()
+    return values.collect().to_series().to_list()
+
+
+def to_pandas(lf: pl.LazyFrame) -> pd.DataFrame:
+    "Collect `lf` into a DataFrame typed like `data.read_files`"
+    return apply_schema(lf.collect().to_pandas())
+
+
+def prep_chart_data(
+    lf: pl.LazyFrame,
+    x_var="planning_year",
+    col_var="tech_type",
+    row_var="case",
+    color="model",
+    dash="None",
+    shape="None",
+    opacity="None",
+    cap_types=None,
+    avg_by=None,
+):
+    """`plots.prep_chart_data` for a LazyFrame.
+
+    The filters and the groupby run as one optimized plan; only the
+    aggregated rows are collected, zero-filled and converted to pandas.
+    """
+    x_var = var_to_none(x_var)
+    col_var = var_to_none(col_var)
+    row_var = var_to_none(row_var)
+    shape = var_to_none(shape)
+    dash = var_to_none(dash)
+    color = var_to_none(color)
+    opacity = var_to_none(opacity)
+    columns = lf.collect_schema().names()
+
+    if "capacity_type" in columns and cap_types is not None:
+        lf = lf.filter(pl.col("capacity_type").is_in(list(cap_types)))
+
+    group_by = list(
+        dict.fromkeys(
+            var
+            for var in [x_var, col_var, row_var, color, shape, dash, opacity, avg_by]
+            if var is not None and var in columns
+        )
+    )
+    if avg_by is None:
+        value = pl.col("value").sum()
+    elif "value_count" in columns:
+        value = pl.col("value_sum").sum() / pl.col("value_count").sum()
+    else:
+        value = pl.col("value").mean()
+    data = (
+        lf.drop_nulls(group_by)
+        .group_by(group_by)
+        .agg(value.alias("value"), pl.len().alias("_rows"))
+        .collect()
+    )
+
+    along = x_var or avg_by
+    if along in group_by and len(group_by) > 1:
+        series_cols = [c for c in group_by if c != along]
+        axes = [data.select(series_cols).unique(), data.select(along).unique()]
+    else:
+        axes = [data.select(c).unique() for c in group_by]
+    n_rows = np.prod([len(axis) for axis in axes], dtype="float64")
+    if n_rows <= FILL_MAX_ROWS:
+        grid = reduce(lambda a, b: a.join(b, how="cross"), axes)
+        data = grid.join(data, on=group_by, how="left").with_columns(
+            value=pl.when(pl.col("_rows").is_null()).then(0).otherwise("value")
+        )
+    else:
+        logger.warning(
+            "Skipped zero-filling %s rows to %s; more than FILL_MAX_ROWS",
+            f"{len(data):,}",
+            f"{n_rows:,.0f}",
+        )
+
+    data = data.select(group_by + ["value"]).sort(group_by).to_pandas()
+    for col in group_by:
+        if col in LABEL_COLUMNS or col == "capacity_type":
+            data[col] = data[col].astype("category")
+    return data
+
+
+def calculate_statistics(
+    lf: pl.LazyFrame,
+    error_method: str = "iqr",
+    x_var="planning_year",
+    col_var="tech_type",
+    row_var="case",
+    color="model",
+):
+    """Mean and error band of `value` by the chart variables, as one plan.
+
+    `error_method` is "iqr", "iqr_approx" (exact quantiles here; polars has no
+    sketch), "std" or "stderr".
+    """
+    by = []
+    for var in map(var_to_none, [x_var, col_var, row_var, color]):
+        if var is not None and var not in by:
+            by.append(var)
+
+    value = pl.col("value")
+    if error_method in ["iqr", "iqr_approx"]:
+        low = value.quantile(0.25, interpolation="linear")
+        high = value.quantile(0.75, interpolation="linear")
+    elif error_method in ["std", "stderr"]:
+        spread = value.std()
+        if error_method == "stderr":
+            spread = (spread / value.count().sqrt()).cast(pl.Float32)
+        low = value.mean() - spread
+        high = value.mean() + spread
+    else:
+        raise ValueError(
+            "Invalid error_method. Choose 'iqr', 'iqr_approx', 'std', or 'stderr'."
+        )
+    stats = (
+        lf.drop_nulls(by)
+        .group_by(by)
+        .agg(
+            value.mean().alias("value"),
+            low.alias("low_value"),
+            high.alias("high_value"),
+        )
+        .sort(by)
+        .collect()
+        .to_pandas()
+    )
+    for col in by:
+        if col in LABEL_COLUMNS:
+            stats[col] = stats[col].astype("category")
+    return stats
@@ -0,0 +1,267 @@
+import os
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pandas as pd
+from duckdb import ColumnExpression, ConstantExpression
+
+from data import (
+    MONTH_SEASON,
+    RESULTS_SCHEMA,
+    SEASONS,
+    apply_schema,
+    day_calendar,
+    evict_cache,
+)
+from plots import fill_idx, var_to_none
+
+LABEL_COLUMNS = [col for col, dtype in RESULTS_SCHEMA.items() if dtype == "category"]
+
+# Row predicates of each derived table, matching data.partition_masks
+_HAS_TIME = "time IS NOT NULL"
+_NOT_LINE = "NOT coalesce(type = 'PowerLine', false)"
+PARTITION_SQL = {
+    "capacity": "time IS NULL",
+    "time": _HAS_TIME,
+    "tx_cap": "time IS NULL AND coalesce(type = 'PowerLine', false)",
+    "tx_time": f"{_HAS_TIME} AND coalesce(type = 'PowerLine', false)",
+    "resource_cap": f"time IS NULL AND {_NOT_LINE}",
+    "resource_time": (
+        f"{_HAS_TIME} AND {_NOT_LINE} AND coalesce(unit = 'MWh', false)"
+        " AND coalesce(contains(variable, 'flow'), false)"
+    ),
+    "storage_time": (
+        f"{_HAS_TIME} AND {_NOT_LINE}"
+        " AND coalesce(contains(variable, 'storage_level'), false)"
+    ),
+    "co2_time": f"{_HAS_TIME} AND {_NOT_LINE} AND coalesce(unit = 't', false)",
+}
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _literal(s: str) -> str:
+    return "'" + str(s).replace("'", "''") + "'"
+
+
+def connect(
+    fns: list,
+    schema: dict = RESULTS_SCHEMA,
+    steps_per_hour: int = 1,
+    database: Path = None,
+) -> duckdb.DuckDBPyConnection:
+    """In-process DuckDB database of the uploaded results files.
+
+    Table `results` holds the files with the `schema` types (NaN values as
+    NULL) plus the calendar columns of `data.add_calendar` for 365-day years,
+    and each derived table of `data.partition_masks` is a view of `results`
+    with the same name.
+
+    Without `database` the tables live in memory. With it they are built once
+    into that file, which DuckDB compresses and pages from disk, and later
+    calls (from any session or worker process) open it read-only.
+    """
+    if database is not None and Path(database).exists():
+        os.utime(database)
+        return duckdb.connect(str(database), read_only=True)
+    tmp = None if database is None else f"{database}.{os.getpid()}.tmp"
+    if tmp is not None:
+        Path(database).parent.mkdir(parents=True, exist_ok=True)
+    con = duckdb.connect(tmp or ":memory:")
+    _load(con, fns, schema, steps_per_hour)
+    if tmp is None:
+        return con
+    con.close()
+    os.replace(tmp, database)
+    evict_cache()
+    return duckdb.connect(str(database), read_only=True)
+
+
+def _load(
+    con: duckdb.DuckDBPyConnection, fns: list, schema: dict, steps_per_hour: int
+) -> None:
+    "Create the `results` table and the derived table views in `con`"
+    parquet = [fn for fn in fns if Path(fn).suffix in [".parquet", ".pq"]]
+    csv = [fn for fn in fns if fn not in parquet]
+    scans = []
+    if parquet:
+        files = ", ".join(map(_literal, parquet))
+        scans.append(f"SELECT * FROM read_parquet([{files}], union_by_name = true)")
+    if csv:
+        files = ", ".join(map(_literal, csv))
+        scans.append(f"SELECT * FROM read_csv([{files}], union_by_name = true)")
+    scan = " UNION ALL BY NAME ".join(scans)
+
+    columns = con.sql(scan).columns
+    casts = []
+    for col, dtype in schema.items():
+        if col not in columns:
+            continue
+        if dtype == "category":
+            casts.append(f"CAST({_quote(col)} AS VARCHAR) AS {_quote(col)}")
+        else:
+            casts.append(
+                f"CAST(CASE WHEN isnan({_quote(col)}) THEN NULL ELSE {_quote(col)} END"
+                f" AS FLOAT) AS {_quote(col)}"
+            )
+    not_empty = " OR ".join(f"{_quote(col)} IS NOT NULL" for col in columns)
+
+    month, day = day_calendar(365)
+    calendar = pd.DataFrame(
+        {
+            "day_of_year": np.arange(365),
+            "day": day,
+            "week": ((day - 1) // 7 + 1).astype("int8"),
+            "month": month,
+            "season": np.array(SEASONS)[MONTH_SEASON[month - 1]],
+        }
+    )
+    con.register("calendar_frame", calendar)
+    con.execute("CREATE TABLE calendar AS SELECT * FROM calendar_frame")
+    con.unregister("calendar_frame")
+
+    con.execute(f"""
+        CREATE TABLE results AS
+        WITH typed AS (
+            SELECT * REPLACE ({", ".join(casts)}) FROM ({scan}) WHERE {not_empty}
+        ),
+        hours AS (
+            SELECT *, CAST(floor((time - 1) / {steps_per_hour}) AS BIGINT) AS _hour
+            FROM typed
+        )
+        SELECT
+            hours.* EXCLUDE (_hour),
+            CAST(_hour % 24 AS TINYINT) AS hour_of_day,
+            calendar.* EXCLUDE (day_of_year)
+        FROM hours
+        LEFT JOIN calendar ON calendar.day_of_year = (_hour // 24) % 365
+        """)
+    for name, predicate in PARTITION_SQL.items():
+        con.execute(f"CREATE VIEW {name} AS SELECT * FROM results WHERE {predicate}")
+
+
+def filter_isin(
+    rel: duckdb.DuckDBPyRelation, filters: dict[str, list]
+) -> duckdb.DuckDBPyRelation:
+    "Keep rows whose value in each column of `filters` is one of the given values"
+    for col, values in filters.items():
+        rel = rel.filter(
+            ColumnExpression(col).isin(*(ConstantExpression(v) for v in values))
+            if len(values)
+            else ConstantExpression(False)
+        )
+    return rel
+
+
+def count_rows(rel: duckdb.DuckDBPyRelation) -> int:
+    "Number of rows of `rel`"
+    return rel.aggregate("count(*)").fetchone()[0]
+
+
+def distinct_values(rel: duckdb.DuckDBPyRelation, col: str) -> list:
+    "Non-null values of `col`, sorted"
+    values = rel.filter(f"{_quote(col)} IS NOT NULL").select(_quote(col)).distinct()
+    return [value for (value,) in values.order(_quote(col)).fetchall()]
+
+
+def to_pandas(rel: duckdb.DuckDBPyRelation) -> pd.DataFrame:
+    "Fetch `rel` into a DataFrame typed like `data.read_files`"
+    return apply_schema(rel.df())
+
+
+def _group_by(rel: duckdb.DuckDBPyRelation, group_by: list[str], aggregates: str):
+    "Aggregate `rel` by `group_by` (dropping NULL keys, as pandas does) to pandas"
+    keys = ", ".join(map(_quote, group_by))
+    not_null = " AND ".join(f"{_quote(col)} IS NOT NULL" for col in group_by)
+    data = rel.filter(not_null).aggregate(f"{keys}, {aggregates}", keys).df()
+    for col in group_by:
+        if col in LABEL_COLUMNS or col == "capacity_type":
+            data[col] = data[col].astype("category")
+    return data
+
+
+def prep_chart_data(
+    rel: duckdb.DuckDBPyRelation,
+    x_var="planning_year",
+    col_var="tech_type",
+    row_var="case",
+    color="model",
+    dash="None",
+    shape="None",
+    opacity="None",
+    cap_types=None,
+    avg_by=None,
+):
+    """`plots.prep_chart_data` for a DuckDB relation.
+
+    The filters and the groupby run as one SQL query; only the aggregated
+    rows come back to pandas to be zero-filled.
+    """
+    x_var = var_to_none(x_var)
+    col_var = var_to_none(col_var)
+    row_var = var_to_none(row_var)
+    shape = var_to_none(shape)
+    dash = var_to_none(dash)
+    color = var_to_none(color)
+    opacity = var_to_none(opacity)
+
+    if "capacity_type" in rel.columns and cap_types is not None:
+        rel = filter_isin(rel, {"capacity_type": cap_types})
+
+    group_by = list(
+        dict.fromkeys(
+            var
+            for var in [x_var, col_var, row_var, color, shape, dash, opacity, avg_by]
+            if var is not None and var in rel.columns
+        )
+    )
+    if avg_by is None:
+        value = "CAST(sum(value) AS FLOAT)"
+    elif "value_count" in rel.columns:
+        value = "sum(value_sum) / sum(value_count)"
+    else:
+        value = "CAST(avg(value) AS FLOAT)"
+    data = _group_by(rel, group_by, f"{value} AS value")
+    data = fill_idx(data, group_by, along=x_var or avg_by)
+    return data.sort_values(group_by, ignore_index=True)
+
+
+def calculate_statistics(
+    rel: duckdb.DuckDBPyRelation,
+    error_method: str = "iqr",
+    x_var="planning_year",
+    col_var="tech_type",
+    row_var="case",
+    color="model",
+):
+    """Mean and error band of `value` by the chart variables, as SQL.
+
+    `error_method` is "iqr", "iqr_approx" (DuckDB's t-digest quantiles),
+    "std" or "stderr".
+    """
+    by = []
+    for var in map(var_to_none, [x_var, col_var, row_var, color]):
+        if var is not None and var not in by:
+            by.append(var)
+
+    if error_method in ["iqr", "iqr_approx"]:
+        quantile = "quantile_cont" if error_method == "iqr" else "approx_quantile"
+        low = f"{quantile}(value, 0.25)"
+        high = f"{quantile}(value, 0.75)"
+    elif error_method in ["std", "stderr"]:
+        spread = "stddev_samp(value)"
+        if error_method == "stderr":
+            spread = f"{spread} / sqrt(count(value))"
+        low = f"avg(value) - {spread}"
+        high = f"avg(value) + {spread}"
+    else:
+        raise ValueError(
+            "Invalid error_method. Choose 'iqr', 'iqr_approx', 'std', or 'stderr'."
+        )
+    stats = _group_by(
+        rel, by, f"avg(value) AS value, {low} AS low_value, {high} AS high_value"
+    )
+    return stats.sort_values(by, ignore_index=True)
@@ -0,0 +1,85 @@
+"""Time calculate_statistics against the per-group lambdas it replaced.
+
+Rows are a year of hourly values per series; the groups are the series
+times hour_of_day, so the group count grows with the series count.
+
+Run from the repository root: python bench/bench_calculate_statistics.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from plots import calculate_statistics  # noqa: E402
+
+BY = ["hour_of_day", "region", "type"]
+
+
+def lambda_statistics(df: pd.DataFrame, error_method: str) -> pd.DataFrame:
+    "The original per-group lambda aggregations"
+    grouped = df.groupby(BY, observed=True)
+    if error_method == "iqr":
+        stats = grouped["value"].agg(
+            value=("mean"),
+            low_value=lambda x: np.percentile(x, 25),
+            high_value=lambda x: np.percentile(x, 75),
+        )
+    elif error_method == "std":
+        stats = grouped["value"].agg(
+            value=("mean"),
+            low_value=lambda x: x.mean() - x.std(),
+            high_value=lambda x: x.mean() + x.std(),
+        )
+    else:
+        stats = grouped["value"].agg(
+            value=("mean"),
+            low_value=lambda x: x.mean() - x.sem(),
+            high_value=lambda x: x.mean() + x.sem(),
+        )
+    return stats.reset_index()
+
+
+def hourly_frame(n_series: int, n_hours: int = 8760, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    series = np.repeat(np.arange(n_series), n_hours)
+    n_types = min(n_series, 8)
+    return pd.DataFrame(
+        {
+            "region": pd.Categorical([f"r{i}" for i in series // n_types]),
+            "type": pd.Categorical([f"t{i}" for i in series % n_types]),
+            "hour_of_day": np.tile(np.arange(n_hours) % 24, n_series).astype("int8"),
+            "value": rng.random(n_series * n_hours).astype("float32"),
+        }
+    )
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    kwargs = dict(x_var="hour_of_day", col_var="region", row_var="None", color="type")
+    print(f"{'method':<8}{'groups':>8}{'lambdas':>12}{'vectorized':>12}{'speedup':>10}")
+    for error_method in ["iqr", "std", "stderr"]:
+        for n_series in [4, 32, 128]:
+            df = hourly_frame(n_series)
+            t_old = best_of(lambda: lambda_statistics(df, error_method))
+            t_new = best_of(lambda: calculate_statistics(df, error_method, **kwargs))
+            print(
+                f"{error_method:<8}{n_series * 24:>8,}{t_old * 1e3:>10.1f}ms"
+                f"{t_new * 1e3:>10.1f}ms{t_old / t_new:>9.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Time add_calendar against the per-row month lookup it replaced.
+
+Both run on a copy of the same synthetic year of hourly results, and the
+hour_of_day and month columns are checked to agree.
+
+Run from the repository root: python bench/bench_calendar.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data import add_calendar  # noqa: E402
+
+
+def add_hour_of_day_and_month(df: pd.DataFrame) -> pd.DataFrame:
+    "The original app.py implementation"
+    df["hour_of_day"] = ((df["time"] - 1) % 24).astype(int)
+    day_of_year = (df["time"] - 1) // 24 + 1
+    month_boundaries = [0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334, 365]
+    df["month"] = day_of_year.apply(
+        lambda day: next(
+            month
+            for month, boundary in enumerate(month_boundaries[1:], start=1)
+            if day <= boundary
+        )
+    )
+    return df
+
+
+def results_frame(n_hours: int = 8760, n_series: int = 48) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "time": np.tile(np.arange(1, n_hours + 1, dtype="float32"), n_series),
+            "value": np.ones(n_hours * n_series, dtype="float32"),
+        }
+    )
+
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    print(f"{'series':>8}{'rows':>12}{'old':>12}{'new':>10}{'speedup':>10}")
+    for n_series in [1, 12, 48]:
+        df = results_frame(n_series=n_series)
+        old = add_hour_of_day_and_month(df.copy())
+        new = add_calendar(df.copy())
+        assert (old["hour_of_day"] == new["hour_of_day"]).all()
+        assert (old["month"] == new["month"]).all()
+
+        t_old = best_of(lambda: add_hour_of_day_and_month(df.copy()), repeat=1)
+        t_new = best_of(lambda: add_calendar(df.copy()), repeat=5)
+        print(
+            f"{n_series:>8}{len(df):>12,}{t_old * 1e3:>10.0f}ms"
+            f"{t_new * 1e3:>8.1f}ms{t_old / t_new:>9.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
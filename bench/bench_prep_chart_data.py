@@ -0,0 +1,84 @@
+"""Time the prep_chart_data engines on synthetic results.
+
+Calls the unmemoized _prep_chart_data, so neither the result cache nor the
+input fingerprint is part of the timings.
+
+Run from the repository root: python bench/bench_prep_chart_data.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import plots  # noqa: E402
+
+CASES = {
+    "capacity cube": dict(
+        x_var="year", col_var="scenario", row_var="region", color="model"
+    ),
+    "hourly": dict(x_var="time", col_var="type", row_var="scenario", color="model"),
+    "one key": dict(x_var="None", col_var="None", row_var="None", color="type"),
+    "hourly mean": dict(
+        x_var="None", col_var="type", row_var="scenario", color="model", avg_by="month"
+    ),
+}
+
+
+def results_frame(n_hours: int = 8760, n_series: int = 48, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    n = n_hours * n_series
+    series = np.repeat(np.arange(n_series), n_hours)
+
+    def label(prefix, k):
+        return pd.Categorical.from_codes(
+            series % k, categories=[f"{prefix}{i}" for i in range(k)]
+        )
+
+    return pd.DataFrame(
+        {
+            "year": label("y", 2),
+            "model": label("m", 3),
+            "scenario": label("s", 2),
+            "region": label("r", 4),
+            "type": label("t", 8),
+            "time": np.tile(np.arange(1, n_hours + 1, dtype="float32"), n_series),
+            "month": np.tile(
+                np.minimum(np.arange(n_hours) // 730 + 1, 12).astype("int8"), n_series
+            ),
+            "value": rng.random(n).astype("float32"),
+        }
+    )
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    df = results_frame()
+    print(f"{len(df):,} rows")
+    print(f"{'case':<16}{'pandas':>10}{'numpy':>10}{'rows out':>12}")
+    for name, kwargs in CASES.items():
+        timings = {
+            engine: best_of(lambda: plots._prep_chart_data(df, engine=engine, **kwargs))
+            for engine in ["pandas", "numpy"]
+        }
+        n_out = len(plots.prep_chart_data(df, **kwargs))
+        print(
+            f"{name:<16}{timings['pandas'] * 1e3:>8.1f}ms"
+            f"{timings['numpy'] * 1e3:>8.1f}ms{n_out:>12,}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Time and peak memory of data.read_file with each pandas CSV engine.
+
+Each engine reads the file in a fresh process, so peak RSS is its own; the
+"import only" row is the baseline of a process that loads data.py and reads
+nothing. Without a path a synthetic results.csv is written: capacity rows
+plus a year of hourly rows per series, with the RESULTS_SCHEMA columns.
+
+Run from the repository root: python bench/bench_read_csv.py [results.csv]
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+ENGINES = ["c", "pyarrow"]
+
+
+def write_results_csv(fn, n_hours: int = 8760, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    series = pd.MultiIndex.from_product(
+        [
+            ["m"],
+            ["a", "b"],
+            [f"r{i}" for i in range(3)],
+            ["Solar", "Wind", "Gas", "Battery"],
+            ["2030", "2040"],
+        ],
+        names=["model", "scenario", "region", "type", "year"],
+    ).to_frame(index=False)
+
+    capacity = series.merge(
+        pd.DataFrame({"variable": ["capacity", "new_capacity", "ret_capacity"]}),
+        how="cross",
+    ).assign(unit="MW", time=np.nan)
+    hourly = series.merge(
+        pd.DataFrame({"variable": ["flow", "storage_level"]}), how="cross"
+    ).assign(unit="MWh")
+    hourly = hourly.loc[hourly.index.repeat(n_hours)].assign(
+        time=np.tile(np.arange(1, n_hours + 1), len(hourly))
+    )
+    df = pd.concat([capacity, hourly], ignore_index=True)
+    df["value"] = rng.random(len(df))
+    columns = ["model", "scenario", "region", "variable", "type", "unit", "year"]
+    df[columns + ["time", "value"]].to_csv(fn, index=False)
+
+
+def measure(fn, engine: str) -> None:
+    "Child process: read `fn` once and print wall time and peak RSS"
+    os.environ["RESULTS_CSV_ENGINE"] = engine
+    sys.path.insert(0, str(ROOT))
+    import data
+
+    start = time.perf_counter()
+    n_rows = len(data.read_file(fn)) if engine != "none" else 0
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak *= 1024
+    print(elapsed, peak, n_rows)
+
+
+def run(fn, engine: str) -> tuple[float, int, int]:
+    out = subprocess.run(
+        [sys.executable, __file__, "--measure", engine, str(fn)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    return float(out[0]), int(out[1]), int(out[2])
+
+
+def main(fn=None):
+    with tempfile.TemporaryDirectory() as tmp:
+        if fn is None:
+            # Written by a child too, since peak RSS carries over into children
+            fn = Path(tmp) / "results.csv"
+            subprocess.run([sys.executable, __file__, "--write", str(fn)], check=True)
+        size = Path(fn).stat().st_size
+        print(f"{fn}: {size / 2**20:,.0f} MiB")
+        _, baseline, _ = run(fn, "none")
+        print(
+            f"{'engine':<12}{'rows':>12}{'wall':>10}{'peak RSS':>12}{'over base':>12}"
+        )
+        print(f"{'import only':<12}{'':>12}{'':>10}{baseline / 2**20:>8.0f} MiB")
+        for engine in ENGINES:
+            runs = [run(fn, engine) for _ in range(3)]
+            elapsed = min(r[0] for r in runs)
+            peak = min(r[1] for r in runs)
+            print(
+                f"{engine:<12}{runs[0][2]:>12,}{elapsed:>9.2f}s"
+                f"{peak / 2**20:>8.0f} MiB{(peak - baseline) / 2**20:>8.0f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        measure(sys.argv[3], sys.argv[2])
+    elif sys.argv[1:2] == ["--write"]:
+        write_results_csv(sys.argv[2])
+    else:
+        main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,711 @@
+import calendar
+import hashlib
+import itertools
+import importlib.util
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from tdigest import TDIGEST_COMPRESSION, digest
+
+logger = logging.getLogger(__name__)
+
+RESULTS_SCHEMA = {
+    "model": "category",
+    "scenario": "category",
+    "region": "category",
+    "variable": "category",
+    "type": "category",
+    "unit": "category",
+    "year": "category",
+    "time": "float32",
+    "value": "float32",
+}
+# The C parser peaks at a fraction of the memory of the others. pyarrow's
+# reader is faster on several cores but peaks higher, so it's opt-in.
+CSV_ENGINE = os.environ.get("RESULTS_CSV_ENGINE", "c")
+PARQUET_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "fastparquet"
+# Worker count and pool type for multi-file uploads. Pyodide (shinylive) has no
+# threads or subprocesses, so ingest is always serial there.
+INGEST_WORKERS = int(os.environ.get("RESULTS_INGEST_WORKERS", os.cpu_count() or 1))
+INGEST_MODE = os.environ.get("RESULTS_INGEST_MODE", "thread")
+# Uploads larger than this (in total, uncompressed; see raw_size) are parsed in
+# chunks of roughly INGEST_CHUNK_BYTES of raw, untyped rows at a time
+CHUNKED_INGEST_BYTES = int(os.environ.get("RESULTS_CHUNKED_INGEST_BYTES", 512 * 2**20))
+INGEST_CHUNK_BYTES = int(os.environ.get("RESULTS_INGEST_CHUNK_BYTES", 64 * 2**20))
+# Rough in-memory size of one untyped row while the parser holds it
+RAW_ROW_BYTES = 512
+# Server-side cache of parsed uploads, shared by every session on the host
+CACHE_DIR = Path(
+    os.environ.get("RESULTS_CACHE_DIR", Path(tempfile.gettempdir()) / "results-cache")
+)
+# (off under Pyodide, where "disk" is browser memory holding a second copy)
+CACHE_MAX_BYTES = int(
+    os.environ.get(
+        "RESULTS_CACHE_MAX_BYTES", 0 if sys.platform == "emscripten" else 4 * 2**30
+    )
+)
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+# Part of every cache entry's name with RESULTS_SCHEMA, so entries written in
+# an older format or schema are never read back; bump on format changes
+CACHE_VERSION = 1
+# "arrow" serves every session's parsed results from one memory-mapped copy of
+# the cache file instead of a private pandas copy per session
+STORE = os.environ.get("RESULTS_STORE", "pandas")
+# "polars" (backends/lazy.py) or "duckdb" (backends/sql.py) run the resource
+# time series charts as queries over the uploaded files;
+# RESULTS_BACKEND_COMPARE=1 also runs the pandas path and warns about any
+# difference between the two
+BACKEND = os.environ.get("RESULTS_BACKEND", "pandas")
+BACKEND_COMPARE = os.environ.get("RESULTS_BACKEND_COMPARE", "0") == "1"
+# Dimensions of the pre-aggregated capacity cube
+CUBE_DIMS = [
+    "year",
+    "model",
+    "scenario",
+    "region",
+    "variable",
+    "type",
+    "unit",
+    "capacity_type",
+]
+# Series dimensions and time granularities of the hourly rollups
+ROLLUP_DIMS = ["year", "model", "scenario", "region", "variable", "type", "unit"]
+ROLLUP_BY = ["hour_of_day", "month"]
+
+MONTH_LENGTHS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+SEASONS = ["winter", "spring", "summer", "fall"]
+# Meteorological seasons, indexed by month - 1
+MONTH_SEASON = np.array([0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0], dtype="int8")
+
+
+def day_calendar(n_days: int, start_year: int = None) -> tuple[np.ndarray, np.ndarray]:
+    """Lookup tables mapping a 0-based day index to its month and day of year.
+
+    Without a `start_year` every year has 365 days. With one, the tables walk
+    forward from that calendar year so leap days land where they should.
+    """
+    months = np.arange(1, 13, dtype="int8")
+    month_blocks = []
+    day_blocks = []
+    covered = 0
+    year = start_year
+    while covered < n_days:
+        lengths = MONTH_LENGTHS.copy()
+        if year is not None:
+            if calendar.isleap(year):
+                lengths[1] = 29
+            year += 1
+        month_blocks.append(np.repeat(months, lengths))
+        day_blocks.append(np.arange(1, lengths.sum() + 1, dtype="int16"))
+        covered += lengths.sum()
+    if not month_blocks:
+        return np.empty(0, dtype="int8"), np.empty(0, dtype="int16")
+    return np.concatenate(month_blocks), np.concatenate(day_blocks)
+
+
+def calendar_dimension(
+    time: pd.Series, steps_per_hour: int = 1, start_year: int = None
+) -> pd.DataFrame:
+    """Calendar columns for each distinct value of the 1-based `time` index.
+
+    `time` counts model timesteps from the start of the first year, so values
+    past 8760 roll into following years. Use `steps_per_hour` for sub-hourly
+    data and `start_year` to account for leap years.
+    """
+    times = np.sort(time.dropna().unique())
+    hours = np.floor((times.astype("float64") - 1) / steps_per_hour).astype("int64")
+    day_idx = hours // 24
+    month, day = day_calendar(int(day_idx.max()) + 1 if len(day_idx) else 0, start_year)
+    month = month[day_idx]
+    day = day[day_idx]
+
+    return pd.DataFrame(
+        {
+            "hour_of_day": (hours % 24).astype("int8"),
+            "day": day,
+            "week": ((day - 1) // 7 + 1).astype("int8"),
+            "month": month,
+            "season": pd.Categorical.from_codes(
+                MONTH_SEASON[month - 1], categories=SEASONS, ordered=True
+            ),
+        },
+        index=pd.Index(times, name="time"),
+    )
+
+
+def add_calendar(df: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    "Join the calendar dimension onto every row. Rows without a time get NA."
+    cal = calendar_dimension(df["time"], **kwargs)
+    idx = cal.index.get_indexer(df["time"])
+    missing = idx < 0
+    for col in cal.columns:
+        values = cal[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = np.where(missing, -1, values.cat.codes.to_numpy()[idx])
+            df[col] = pd.Categorical.from_codes(codes, dtype=values.dtype)
+        else:
+            df[col] = pd.arrays.IntegerArray(values.to_numpy()[idx], missing)
+    return df
+
+
+def apply_schema(df: pd.DataFrame, schema: dict = RESULTS_SCHEMA) -> pd.DataFrame:
+    "Cast columns that did not come out of the reader with their schema dtype"
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        if dtype == "category":
+            if not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype("category")
+            # Keep labels as strings so categories from different files can merge
+            categories = df[col].cat.categories
+            if not pd.api.types.is_string_dtype(categories):
+                df[col] = df[col].cat.rename_categories(categories.astype(str))
+        elif df[col].dtype != dtype:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def filter_mask(df: pd.DataFrame, filters: list[tuple]) -> np.ndarray:
+    "Rows matching every `(column, op, value)` or `(column, op)` filter"
+    mask = np.ones(len(df), dtype=bool)
+    for col, op, *value in filters:
+        value = value[0] if value else None
+        s = df[col]
+        if op == "is null":
+            mask &= s.isna().to_numpy()
+        elif op == "not null":
+            mask &= s.notna().to_numpy()
+        elif op == "==":
+            mask &= category_mask(s, value)
+        elif op == "!=":
+            mask &= ~category_mask(s, value)
+        elif op == "in":
+            mask &= s.isin(value).to_numpy()
+        elif op == "not in":
+            mask &= ~s.isin(value).to_numpy()
+        else:
+            raise ValueError(f"Unsupported filter operator '{op}'")
+    return mask
+
+
+def _arrow_filter(filters: list[tuple], schema: dict = RESULTS_SCHEMA):
+    import pyarrow.compute as pc
+
+    expr = None
+    for col, op, *value in filters:
+        value = value[0] if value else None
+        field = pc.field(col)
+        # NaN counts as missing in float columns, as in pandas. Spelled with
+        # is_nan because row group pruning ignores is_null(nan_is_null=True)
+        # and drops groups without nulls.
+        is_missing = field.is_null()
+        if str(schema.get(col, "")).startswith("float"):
+            is_missing = is_missing | pc.is_nan(field)
+        term = {
+            "is null": lambda: is_missing,
+            "not null": lambda: ~is_missing,
+            "==": lambda: field == value,
+            "!=": lambda: field != value,
+            "in": lambda: field.isin(value),
+            "not in": lambda: ~field.isin(value),
+        }[op]()
+        expr = term if expr is None else expr & term
+    return expr
+
+
+def read_file(
+    fn, schema: dict = RESULTS_SCHEMA, columns: list[str] = None, filters=None
+) -> pd.DataFrame:
+    """Read one results file, keeping only `columns` and rows matching `filters`.
+
+    `filters` is a list of `(column, op, value)` tuples that must all hold, where
+    op is one of "==", "!=", "in" or "not in", or `(column, op)` tuples with
+    "is null" or "not null". Parquet
+    reads push them down so skipped row groups and rows are never materialized.
+    """
+    filters = filters or []
+    if columns is not None:
+        # Filtered columns have to be read even if they are not returned
+        read_columns = list(dict.fromkeys(columns + [f[0] for f in filters]))
+    else:
+        read_columns = None
+
+    if Path(fn).suffix in [".parquet", ".pq"]:
+        kwargs = {}
+        if filters and PARQUET_ENGINE == "pyarrow":
+            kwargs["filters"] = _arrow_filter(filters, schema)
+        elif filters:
+            # fastparquet can't test for nulls; the rest prunes row groups and rows
+            dnf = [f for f in filters if f[1] not in ["is null", "not null"]]
+            if dnf:
+                kwargs.update(filters=dnf, row_filter=True)
+        df = pd.read_parquet(fn, engine=PARQUET_ENGINE, columns=read_columns, **kwargs)
+    else:
+        df = pd.read_csv(fn, dtype=schema, engine=CSV_ENGINE, usecols=read_columns)
+    df = apply_schema(df.dropna(how="all"), schema)
+    if filters:
+        df = df.loc[filter_mask(df, filters), :]
+    if columns is not None:
+        df = df.loc[:, columns]
+    return df
+
+
+def _read_timed(fn, **kwargs) -> pd.DataFrame:
+    start = time.perf_counter()
+    df = read_file(fn, **kwargs)
+    logger.info(
+        "Read %s (%d rows) in %.2fs",
+        Path(fn).name,
+        len(df),
+        time.perf_counter() - start,
+    )
+    return df
+
+
+def concat_categorized(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    "Concatenate frames, unioning categories so categorical columns stay categorical"
+    if len(frames) > 1:
+        for col in frames[0].columns:
+            if all(
+                col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype)
+                for df in frames
+            ):
+                categories = union_categoricals(
+                    [df[col] for df in frames], sort_categories=True
+                ).categories
+                for df in frames:
+                    df[col] = df[col].cat.set_categories(categories)
+    return pd.concat(frames)
+
+
+def read_files(
+    fns: list,
+    schema: dict = RESULTS_SCHEMA,
+    columns: list[str] = None,
+    filters: list[tuple] = None,
+    workers: int = None,
+    mode: str = None,
+) -> pd.DataFrame:
+    """Read and concatenate result files, parsing several at once when possible.
+
+    `columns` and `filters` are passed to `read_file`. `mode` is "thread" or
+    "process"; `workers` caps the pool size.
+    """
+    workers = min(workers or INGEST_WORKERS, len(fns))
+    mode = mode or INGEST_MODE
+    if sys.platform == "emscripten":
+        workers = 1
+
+    read = partial(_read_timed, schema=schema, columns=columns, filters=filters)
+    start = time.perf_counter()
+    if workers > 1:
+        if mode == "process":
+            # Forking would copy the server's threads and open sockets
+            executor = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        elif mode == "thread":
+            executor = ThreadPoolExecutor(workers)
+        else:
+            raise ValueError("Invalid mode. Choose 'thread' or 'process'.")
+        with executor:
+            frames = list(executor.map(read, fns))
+    else:
+        frames = [read(fn) for fn in fns]
+    logger.info(
+        "Read %d files with %d %s worker(s) in %.2fs",
+        len(fns),
+        workers,
+        mode,
+        time.perf_counter() - start,
+    )
+    return concat_categorized(frames)
+
+
+def category_mask(s: pd.Series, value) -> np.ndarray:
+    "Elementwise `s == value`, compared on category codes when `s` is categorical"
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        code = s.cat.categories.get_indexer([value])[0]
+        if code < 0:
+            return np.zeros(len(s), dtype=bool)
+        return s.cat.codes.to_numpy() == code
+    return (s == value).to_numpy()
+
+
+def category_contains(s: pd.Series, pat: str) -> np.ndarray:
+    """Elementwise `s.str.contains(pat)` without regex; missing values are False.
+
+    For categoricals the test runs once per category and is mapped back through
+    the codes, so the cost scales with the number of distinct values.
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        matches = np.asarray(s.cat.categories.str.contains(pat, regex=False))
+        # Code -1 (missing) picks up the trailing False
+        return np.append(matches, False)[s.cat.codes.to_numpy()]
+    return s.str.contains(pat, regex=False, na=False).to_numpy()
+
+
+def partition_masks(df: pd.DataFrame) -> dict[str, np.ndarray]:
+    "Boolean row masks of each derived table, from one pass over the parsed results"
+    has_time = df["time"].notna().to_numpy()
+    is_line = category_mask(df["type"], "PowerLine")
+    is_mwh = category_mask(df["unit"], "MWh")
+    is_tonnes = category_mask(df["unit"], "t")
+    is_flow = category_contains(df["variable"], "flow")
+    is_storage = category_contains(df["variable"], "storage_level")
+
+    time_resource = has_time & ~is_line
+    return {
+        "capacity": ~has_time,
+        "time": has_time,
+        "tx_cap": ~has_time & is_line,
+        "tx_time": has_time & is_line,
+        "resource_cap": ~has_time & ~is_line,
+        "resource_time": time_resource & is_mwh & is_flow,
+        "storage_time": time_resource & is_storage,
+        "co2_time": time_resource & is_tonnes,
+    }
+
+
+def partition_results(df: pd.DataFrame) -> dict[str, np.ndarray]:
+    """Row positions of each derived table, from one pass over the parsed results.
+
+    Slice a table out with `take_partition(df, positions[name])`.
+    """
+    dtype = "int32" if len(df) < 2**31 else "int64"
+    return {
+        name: np.flatnonzero(mask).astype(dtype)
+        for name, mask in partition_masks(df).items()
+    }
+
+
+def sort_by_partition(df: pd.DataFrame) -> pd.DataFrame:
+    "Reorder rows so each derived table is a contiguous block"
+    masks = partition_masks(df)
+    key = np.zeros(len(df), dtype="int8")
+    for bit, name in enumerate(
+        ["co2_time", "storage_time", "resource_time", "tx_time", "tx_cap", "time"]
+    ):
+        key |= masks[name].astype("int8") << bit
+    return df.take(np.argsort(key, kind="stable")).reset_index(drop=True)
+
+
+def take_partition(df: pd.DataFrame, positions: np.ndarray) -> pd.DataFrame:
+    "Rows at `positions`, as a view when they are one contiguous block"
+    if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+        return df.iloc[positions[0] : positions[-1] + 1]
+    return df.take(positions)
+
+
+def build_cube(df: pd.DataFrame, dims: list[str] = CUBE_DIMS) -> pd.DataFrame:
+    """Pre-aggregate `value` over every combination of `dims` present in `df`.
+
+    Any chart grouped by a subset of the dims and filtered on their values sums
+    to the same result from the cube as from the raw rows.
+    """
+    dims = [d for d in dims if d in df.columns]
+    return df.groupby(dims, as_index=False, observed=True, dropna=False)["value"].sum()
+
+
+def build_rollups(
+    df: pd.DataFrame,
+    by: list[str] = ROLLUP_BY,
+    dims: list[str] = ROLLUP_DIMS,
+) -> dict[str, pd.DataFrame]:
+    """Per-series partial aggregates of `value` at each time granularity in `by`.
+
+    Each rollup has one row per series and granularity value, with the sum,
+    count and sum of squares of `value`. Partials merge by adding them, so
+    averages and standard deviations over any grouping of the dims can be
+    derived without rescanning the hourly rows.
+    """
+    dims = [d for d in dims if d in df.columns]
+    values = df["value"].to_numpy(dtype="float64")
+    rollups = {}
+    for granularity in by:
+        keys = dims + [granularity]
+        frame = df[keys].reset_index(drop=True)
+        frame["value"] = values
+        frame["value_sq"] = values * values
+        rollups[granularity] = frame.groupby(
+            keys, as_index=False, observed=True, dropna=False
+        ).agg(
+            value_sum=("value", "sum"),
+            value_count=("value", "count"),
+            value_sumsq=("value_sq", "sum"),
+        )
+    return rollups
+
+
+def build_digests(
+    df: pd.DataFrame,
+    by: list[str] = ROLLUP_BY,
+    dims: list[str] = ROLLUP_DIMS,
+    compression: float = TDIGEST_COMPRESSION,
+) -> dict[str, pd.DataFrame]:
+    """Per-series t-digests of `value` at each time granularity in `by`.
+
+    The quantile counterpart of `build_rollups`: digests merge across any
+    grouping of the dims, so approximate quartiles don't need the hourly rows.
+    """
+    dims = [d for d in dims if d in df.columns]
+    return {
+        granularity: digest(df, dims + [granularity], compression=compression)
+        for granularity in by
+    }
+
+
+def iter_file_chunks(
+    fn, schema: dict = RESULTS_SCHEMA, chunk_rows: int = None
+) -> Iterator[pd.DataFrame]:
+    "Yield typed chunks of a results file without reading all of it at once"
+    chunk_rows = chunk_rows or max(1, INGEST_CHUNK_BYTES // RAW_ROW_BYTES)
+    if Path(fn).suffix in [".parquet", ".pq"]:
+        if PARQUET_ENGINE == "pyarrow":
+            import pyarrow.parquet as pq
+
+            chunks = (
+                batch.to_pandas()
+                for batch in pq.ParquetFile(fn).iter_batches(batch_size=chunk_rows)
+            )
+        else:
+            import fastparquet
+
+            # fastparquet can only stream whole row groups
+            chunks = fastparquet.ParquetFile(fn).iter_row_groups()
+    else:
+        chunks = pd.read_csv(fn, dtype=schema, chunksize=chunk_rows)
+    for chunk in chunks:
+        yield apply_schema(chunk.dropna(how="all"), schema)
+
+
+def read_files_chunked(
+    fns: list, schema: dict = RESULTS_SCHEMA, chunk_rows: int = None
+) -> tuple[pd.DataFrame, dict[str, np.ndarray]]:
+    """Stream result files chunk by chunk into typed column buffers.
+
+    Peak memory is the typed result plus one raw chunk, instead of the whole
+    raw file plus a concatenated copy. Partition positions (see
+    `partition_results`) are computed per chunk and returned with the frame.
+    """
+    buffers = {}
+    categories = {}
+    positions = {}
+    n_rows = 0
+
+    def filler(col, n):
+        if col in categories:
+            return np.full(n, -1, dtype="int16")
+        return np.full(n, np.nan)
+
+    chunks = itertools.chain.from_iterable(
+        iter_file_chunks(fn, schema, chunk_rows) for fn in fns
+    )
+    for chunk in chunks:
+        for name, pos in partition_results(chunk).items():
+            positions.setdefault(name, []).append(pos.astype("int64") + n_rows)
+        for col in chunk.columns:
+            s = chunk[col]
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                # Recode against the categories seen so far, adding new ones
+                seen = categories.get(col, s.cat.categories[:0])
+                seen = seen.append(s.cat.categories.difference(seen))
+                categories[col] = seen
+                recode = np.append(seen.get_indexer(s.cat.categories), -1)
+                values = recode[s.cat.codes.to_numpy()]
+                values = values.astype("int16" if len(seen) < 2**15 else "int32")
+            else:
+                values = s.to_numpy()
+            if col not in buffers:
+                buffers[col] = [filler(col, n_rows)] if n_rows else []
+            buffers[col].append(values)
+        for col in buffers.keys() - set(chunk.columns):
+            buffers[col].append(filler(col, len(chunk)))
+        n_rows += len(chunk)
+
+    columns = {}
+    for col in list(buffers):
+        values = np.concatenate(buffers.pop(col))
+        if col in categories:
+            # Sorted, like the categories concat_categorized unions
+            values = pd.Categorical.from_codes(
+                values, categories=categories[col]
+            ).reorder_categories(categories[col].sort_values())
+        columns[col] = values
+    dtype = "int32" if n_rows < 2**31 else "int64"
+    positions = {
+        name: np.concatenate(pos).astype(dtype) for name, pos in positions.items()
+    }
+    return pd.DataFrame(columns, copy=False), positions
+
+
+def raw_size(fn, sample_bytes: int = 2**20) -> int:
+    """Estimated uncompressed size of a results file, in bytes.
+
+    Gzipped files are scaled by the compression ratio of their first
+    `sample_bytes` (the gzip trailer only holds the size modulo 4 GiB), and
+    Parquet files report the uncompressed size of their row groups.
+    """
+    size = os.path.getsize(fn)
+    if Path(fn).suffix == ".gz":
+        with open(fn, "rb") as f:
+            sample = f.read(sample_bytes)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            inflated = len(decompressor.decompress(sample))
+        except zlib.error:
+            return size
+        consumed = len(sample) - len(decompressor.unused_data)
+        return int(size * inflated / max(consumed, 1))
+    if Path(fn).suffix in [".parquet", ".pq"] and HAS_PYARROW:
+        import pyarrow.parquet as pq
+
+        metadata = pq.ParquetFile(fn).metadata
+        return sum(
+            metadata.row_group(i).total_byte_size
+            for i in range(metadata.num_row_groups)
+        )
+    return size
+
+
+def file_digest(fn, block_bytes: int = 2**20) -> str:
+    "Hash of a file's contents, read in blocks"
+    h = hashlib.blake2b(digest_size=16)
+    with open(fn, "rb") as f:
+        while block := f.read(block_bytes):
+            h.update(block)
+    return h.hexdigest()
+
+
+def upload_key(fns: list) -> str:
+    "Cache key for a set of uploaded files, in upload order"
+    h = hashlib.blake2b(digest_size=16)
+    for fn in fns:
+        h.update(file_digest(fn).encode())
+    return h.hexdigest()
+
+
+def cache_path(key: str, suffix: str = ".feather") -> Path | None:
+    """Path of the cache entry for `key`, or None when the cache is off.
+
+    The cache needs pyarrow, since entries are Feather (Arrow IPC) files that
+    can be memory-mapped, and a directory only this user can write to:
+    CACHE_DIR is created with mode 0o700, and left unused if it already
+    exists with other owners or writers.
+    """
+    if CACHE_MAX_BYTES <= 0 or not HAS_PYARROW:
+        return None
+    CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+    stat = CACHE_DIR.stat()
+    if stat.st_mode & 0o022 or (hasattr(os, "getuid") and stat.st_uid != os.getuid()):
+        logger.warning("Not caching results in %s; others can write to it", CACHE_DIR)
+        return None
+    version = hashlib.blake2b(
+        repr((CACHE_VERSION, RESULTS_SCHEMA)).encode(), digest_size=4
+    ).hexdigest()
+    return CACHE_DIR / f"{key}-{version}{suffix}"
+
+
+def _arrow_to_pandas(table) -> pd.DataFrame:
+    """Convert a single-chunk Arrow table without copying where possible.
+
+    Null-free numeric columns and dictionary indices are wrapped as numpy views
+    of the Arrow buffers, so a memory-mapped table stays backed by the file and
+    its pages are shared between every process that maps it.
+    """
+    import pyarrow as pa
+
+    columns = {}
+    for name, col in zip(table.column_names, table.columns):
+        if col.num_chunks != 1 or col.null_count:
+            columns[name] = col.to_pandas()
+            continue
+        arr = col.chunk(0)
+        if pa.types.is_dictionary(arr.type):
+            codes = arr.indices.to_numpy(zero_copy_only=True)
+            categories = pd.Index(arr.dictionary.to_pandas())
+            columns[name] = pd.Categorical.from_codes(
+                codes, categories=categories, validate=False
+            )
+        elif pa.types.is_integer(arr.type) or pa.types.is_floating(arr.type):
+            columns[name] = arr.to_numpy(zero_copy_only=True)
+        else:
+            columns[name] = col.to_pandas()
+    return pd.DataFrame(columns, copy=False)
+
+
+def load_cached(key: str) -> pd.DataFrame | None:
+    "Parsed results for `key`, or None on a cache miss"
+    path = cache_path(key)
+    if path is None:
+        return None
+    import pyarrow.feather as feather
+
+    try:
+        df = _arrow_to_pandas(feather.read_table(path, memory_map=True))
+        # Touch so eviction sees this entry as recently used
+        os.utime(path)
+    except FileNotFoundError:
+        # Never written, or evicted by another session meanwhile
+        return None
+    logger.info("Loaded cached results %s", path.name)
+    return df
+
+
+def store_cached(key: str, df: pd.DataFrame) -> bool:
+    """Write parsed results to the cache, then evict least recently used entries.
+
+    Returns False when caching is disabled (see `cache_path`).
+    """
+    path = cache_path(key)
+    if path is None:
+        return False
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    df = df.reset_index(drop=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, name in enumerate(table.column_names):
+        if df[name].dtype.kind == "f":
+            # Keep NaN as a float value rather than an Arrow null so the
+            # column can be mapped back without a copy
+            values = pa.array(df[name].to_numpy(), from_pandas=False)
+            table = table.set_column(i, name, values)
+    # One chunk per column, so reads don't have to stitch batches together
+    feather.write_feather(
+        table, tmp, compression="uncompressed", chunksize=max(len(df), 1)
+    )
+    # Other sessions may be reading the same key; only expose complete files
+    os.replace(tmp, path)
+    evict_cache()
+    return True
+
+
+def evict_cache(max_bytes: int = None) -> None:
+    "Delete the least recently used cache entries until under `max_bytes`"
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for path in CACHE_DIR.glob("*"):
+        if path.suffix in [".feather", ".duckdb"]:
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
@@ -1,8 +1,78 @@
+import asyncio
+import base64
+import functools
+import gzip
+import hashlib
+import importlib.util
+import inspect
+import io
+import json
+import logging
+import multiprocessing
+import sys
+import warnings
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
 import altair as alt
+import numpy as np
 import pandas as pd
 from altair.utils import Undefined
+from altair.vegalite.data import default_data_transformer
 from shiny.express import module, render, ui
+from shiny.session import get_current_session
 from shinywidgets import render_altair
+from starlette.responses import Response
+
+from data import HAS_PYARROW
+from tdigest import digest_stats
+
+logger = logging.getLogger(__name__)
+
+# Bounds for the memoized prep_chart_data results shared by charts, tables and
+# downloads
+PREP_CACHE_MAX_ENTRIES = 64
+PREP_CACHE_MAX_BYTES = 256 * 2**20
+# Largest zero-filled chart table fill_idx will build
+FILL_MAX_ROWS = 5_000_000
+# Default prep_chart_data engine: "numpy" aggregates with np.bincount over
+# combined group codes and falls back to "pandas" when it can't
+PREP_ENGINE = "numpy"
+# Name of the x pan/zoom selection on charts built with interactive_zoom; the
+# app reads the visible x range from it
+ZOOM_PARAM = "zoom"
+# Altair data transformer of the chart builders: "session_csv" serves each
+# chart's data as CSV from a session route, "default" inlines JSON rows
+CHART_DATA_TRANSFORMER = "session_csv"
+# Chart datasets each session keeps for the browser to fetch
+CHART_DATA_MAX_ENTRIES = 16
+# Charts with more rows than this are rendered on the server by vl-convert,
+# when it's installed, and sent as STATIC_CHART_FORMAT ("svg" or "png")
+# images unless the user asks for interactive charts
+HAS_VL_CONVERT = importlib.util.find_spec("vl_convert") is not None
+STATIC_CHART_MIN_ROWS = 50_000
+STATIC_CHART_FORMAT = "svg"
+STATIC_CACHE_MAX_ENTRIES = 32
+STATIC_CACHE_MAX_BYTES = 64 * 2**20
+# vl-convert holds the GIL while it draws, so images are drawn in this many
+# worker processes rather than on the event loop or in a thread
+STATIC_RENDER_WORKERS = 1
+# Chart objects and validated specs kept by memoize_spec, across sessions
+SPEC_CACHE_MAX_ENTRIES = 64
+SPEC_CACHE_MAX_BYTES = 256 * 2**20
+
+_fingerprints = {}
+_prep_cache = OrderedDict()
+_prep_cache_bytes = 0
+_chart_data = {}
+_static_cache = OrderedDict()
+_static_cache_bytes = 0
+_static_executor = None
+_spec_cache = OrderedDict()
+_spec_cache_bytes = 0
+_spec_cache_counts = {"hits": 0, "misses": 0, "spec_reuses": 0, "spec_conversions": 0}
+_chart_specs = {}
 
 
 def var_to_none(var):
@@ -64,14 +134,145 @@ def config_chart_row_col(
     return chart
 
 
-def fill_idx(df: pd.DataFrame, cols) -> pd.DataFrame:
-    midx = pd.MultiIndex.from_product([df[c].unique() for c in cols], names=cols)
+def fill_idx(
+    df: pd.DataFrame, cols, along=None, max_rows=FILL_MAX_ROWS
+) -> pd.DataFrame:
+    """Zero-fill missing combinations of `cols`.
+
+    With `along`, only the values of that column (the x axis) are filled in,
+    within each combination of the other columns that appears in `df`, so the
+    output grows with the number of observed series rather than with the
+    product of every column's values. Fills larger than `max_rows` are
+    skipped with a warning.
+    """
+    if along in cols and len(cols) > 1:
+        series_cols = [c for c in cols if c != along]
+        series = df[series_cols].drop_duplicates()
+        x = df[[along]].drop_duplicates()
+        n_rows = len(series) * len(x)
+    else:
+        n_rows = np.prod([df[c].nunique() for c in cols], dtype="float64")
+    if n_rows > max_rows:
+        warnings.warn(
+            f"Skipped zero-filling {len(df):,} rows to {n_rows:,.0f}; "
+            f"more than max_rows ({max_rows:,})",
+            stacklevel=2,
+        )
+        return df
+
+    if along in cols and len(cols) > 1:
+        midx = pd.MultiIndex.from_frame(series.merge(x, how="cross")[cols])
+    elif len(cols) == 1:
+        # set_index of one column is a plain Index, which a one-level
+        # MultiIndex wouldn't match
+        midx = pd.Index(df[cols[0]].unique(), name=cols[0])
+    else:
+        midx = pd.MultiIndex.from_product([df[c].unique() for c in cols], names=cols)
+    dtypes = df.dtypes[cols]
     df = df.set_index(cols)
     df = df.reindex(midx, fill_value=0)
-    return df.reset_index()
+    # The index widens small integer keys; give them their dtype back
+    return df.reset_index().astype(dtypes.to_dict())
 
 
-def prep_chart_data(
+def _group_codes(s: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    "Dense codes of the observed values of `s` (-1 for missing) and the values"
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes = s.cat.codes.to_numpy()
+        observed = np.zeros(len(s.cat.categories) + 1, dtype=bool)
+        observed[codes] = True
+        observed = observed[:-1]
+        remap = np.append(np.cumsum(observed) - 1, -1)
+        return remap[codes], s.cat.categories[observed]
+    codes, uniques = pd.factorize(s, sort=True)
+    return codes, uniques
+
+
+def _bincount_chart_data(
+    df: pd.DataFrame, cols: list[str], along=None, how="sum", max_rows=FILL_MAX_ROWS
+):
+    """Aggregate and zero-fill `df` by `cols` with np.bincount.
+
+    Matches `groupby(cols).sum()` (or `.mean()`, or the rollup ratio for
+    `how="rollup"`) followed by `fill_idx(..., along=along)`, but sizes the
+    output from the group codes and fills it in one pass. Returns None when
+    the filled output would exceed `max_rows` so the caller can fall back to
+    pandas.
+    """
+    if not cols:
+        return None
+    codes, labels = zip(*(_group_codes(df[c]) for c in cols))
+    valid = np.logical_and.reduce([c >= 0 for c in codes])
+    codes = [c[valid] for c in codes]
+    sizes = [len(values) for values in labels]
+
+    if along in cols and len(cols) > 1:
+        # Observed series x every observed value along the x axis
+        x = cols.index(along)
+        series_cols = [i for i in range(len(cols)) if i != x]
+        n_product = np.prod([sizes[i] for i in series_cols], dtype="float64")
+        if n_product * sizes[x] > 2**62:
+            return None
+        series = np.ravel_multi_index(
+            [codes[i] for i in series_cols], [sizes[i] for i in series_cols]
+        )
+        if n_product <= max(len(series), 2**20):
+            present = np.bincount(series, minlength=int(n_product)) > 0
+            series_keys = np.flatnonzero(present)
+            series = (np.cumsum(present) - 1)[series]
+        else:
+            series_keys, series = np.unique(series, return_inverse=True)
+        n_rows = len(series_keys) * sizes[x]
+        if n_rows > max_rows:
+            return None
+        cells = series * sizes[x] + codes[x]
+        series_codes = np.unravel_index(
+            np.repeat(series_keys, sizes[x]), [sizes[i] for i in series_cols]
+        )
+        out_codes = [None] * len(cols)
+        for i, c in zip(series_cols, series_codes):
+            out_codes[i] = c
+        out_codes[x] = np.tile(np.arange(sizes[x]), len(series_keys))
+    else:
+        n_rows = np.prod(sizes, dtype="float64")
+        if n_rows > max_rows:
+            return None
+        n_rows = int(n_rows)
+        cells = np.ravel_multi_index(codes, sizes)
+        out_codes = np.unravel_index(np.arange(n_rows), sizes)
+
+    def bincount(weights=None):
+        return np.bincount(cells, weights=weights, minlength=n_rows)
+
+    values_col = "value_sum" if how == "rollup" else "value"
+    values = df[values_col].to_numpy("float64")
+    values = values[valid]
+    missing = np.isnan(values)
+    value = bincount(np.where(missing, 0, values))
+    if how != "sum":
+        if how == "rollup":
+            count = bincount(df["value_count"].to_numpy("float64")[valid])
+        else:
+            count = bincount(~missing)
+        # Observed groups without values are NaN, as in pandas; unobserved
+        # cells are the zero fill
+        with np.errstate(invalid="ignore", divide="ignore"):
+            value = np.where(bincount() > 0, value / count, 0)
+
+    data = {}
+    for col, values, c in zip(cols, labels, out_codes):
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            data[col] = pd.Categorical.from_codes(
+                df[col].cat.categories.get_indexer(values)[c], dtype=df[col].dtype
+            )
+        else:
+            data[col] = values.take(c)
+    # Same value dtype as the pandas path
+    data["value"] = value.astype(df[values_col].dtype, copy=False)
+    return pd.DataFrame(data)
+
+
+def _prep_chart_data(
     df: pd.DataFrame,
     x_var="planning_year",
     col_var="tech_type",
@@ -82,6 +283,7 @@ def prep_chart_data(
     opacity="None",
     cap_types=None,
     avg_by=None,
+    engine=PREP_ENGINE,
 ):
     x_var = var_to_none(x_var)
     col_var = var_to_none(col_var)
@@ -94,25 +296,615 @@ def prep_chart_data(
     if "capacity_type" in df.columns and cap_types is not None:
         df = df.loc[df["capacity_type"].isin(cap_types), :]
 
-    group_by = [
-        var
-        for var in [x_var, col_var, row_var, color, shape, dash, opacity]
-        if var is not None and var in df.columns
-    ]
-
+    # Canonical key order (first use, averaging period last) so the output
+    # doesn't depend on hash order and is the same in every process
+    group_by = list(
+        dict.fromkeys(
+            var
+            for var in [x_var, col_var, row_var, color, shape, dash, opacity, avg_by]
+            if var is not None and var in df.columns
+        )
+    )
     if avg_by is None:
-        data = df.groupby(list(set(group_by)), as_index=False, observed=True)[
-            "value"
-        ].sum()
+        how = "sum"
     else:
-        group_by.append(avg_by)
-        data = df.groupby(list(set(group_by)), as_index=False, observed=True)[
-            "value"
-        ].mean()
-    data = fill_idx(data, list(set(group_by)))
+        how = "rollup" if "value_count" in df.columns else "mean"
+
+    data = None
+    if engine == "numpy":
+        data = _bincount_chart_data(df, group_by, along=x_var or avg_by, how=how)
+    if data is None:
+        grouped = df.groupby(group_by, as_index=False, observed=True)
+        if how == "rollup":
+            # Partial aggregates from data.build_rollups
+            data = grouped[["value_sum", "value_count"]].sum()
+            data["value"] = (data.pop("value_sum") / data.pop("value_count")).astype(
+                df["value_sum"].dtype
+            )
+        elif how == "sum":
+            data = grouped["value"].sum()
+        else:
+            data = grouped["value"].mean()
+        data = fill_idx(data, group_by, along=x_var or avg_by)
+    return data.sort_values(group_by, ignore_index=True)
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of a DataFrame's columns, dtypes and values.
+
+    Reactive calcs hand the same object to every consumer, so the hash is
+    remembered per live object and only computed once.
+    """
+    entry = _fingerprints.get(id(df))
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(list(zip(df.columns, map(str, df.dtypes)))).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return _remember_fingerprint(df, h.hexdigest())
+
+
+def _remember_fingerprint(df: pd.DataFrame, fingerprint: str) -> str:
+    # Only for as long as `df` lives; frames derived from it are new objects
+    # and get hashed on their own
+    key = id(df)
+    _fingerprints[key] = (
+        weakref.ref(df, lambda _: _fingerprints.pop(key, None)),
+        fingerprint,
+    )
+    return fingerprint
+
+
+def prep_chart_data(
+    df: pd.DataFrame,
+    x_var="planning_year",
+    col_var="tech_type",
+    row_var="case",
+    color="model",
+    dash="None",
+    shape="None",
+    opacity="None",
+    cap_types=None,
+    avg_by=None,
+    engine=PREP_ENGINE,
+):
+    """Aggregate `df` for charting, memoized on its content and the arguments.
+
+    `engine` is "numpy" (np.bincount over group codes, see
+    `_bincount_chart_data`) or "pandas" (groupby plus `fill_idx`). Rows and
+    columns come out in a canonical order, so `frame_fingerprint` of the
+    result is stable across processes; it's already known for returned
+    frames and costs nothing to look up.
+    """
+    global _prep_cache_bytes
+
+    key = (
+        frame_fingerprint(df),
+        x_var,
+        col_var,
+        row_var,
+        color,
+        dash,
+        shape,
+        opacity,
+        None if cap_types is None else tuple(cap_types),
+        avg_by,
+        engine,
+    )
+    if key in _prep_cache:
+        _prep_cache.move_to_end(key)
+        data, _, fingerprint = _prep_cache[key]
+        data = data.copy()
+        _remember_fingerprint(data, fingerprint)
+        return data
+
+    data = _prep_chart_data(
+        df,
+        x_var,
+        col_var,
+        row_var,
+        color,
+        dash,
+        shape,
+        opacity,
+        cap_types,
+        avg_by,
+        engine,
+    )
+    fingerprint = frame_fingerprint(data)
+    size = data.memory_usage(deep=True).sum()
+    if size <= PREP_CACHE_MAX_BYTES:
+        _prep_cache[key] = (data.copy(), size, fingerprint)
+        _prep_cache_bytes += size
+        while (
+            len(_prep_cache) > PREP_CACHE_MAX_ENTRIES
+            or _prep_cache_bytes > PREP_CACHE_MAX_BYTES
+        ):
+            _, (_, evicted_size, _) = _prep_cache.popitem(last=False)
+            _prep_cache_bytes -= evicted_size
     return data
 
 
+def compare_results(
+    data: pd.DataFrame, expected: pd.DataFrame, values: list[str] = ["value"]
+) -> bool:
+    """Whether two chart tables hold the same rows, warning when they don't.
+
+    Used to check the optional query backends against the pandas path. Rows
+    are matched on every column not in `values`, regardless of order and of
+    categorical versus plain dtypes; `values` are compared with a float32
+    tolerance.
+    """
+    if sorted(data.columns) != sorted(expected.columns):
+        warnings.warn(
+            f"Columns {list(data.columns)} differ from {list(expected.columns)}",
+            stacklevel=2,
+        )
+        return False
+    keys = [col for col in expected.columns if col not in values]
+
+    def canonical(df):
+        df = df[keys + values].astype({col: str for col in keys})
+        return df.sort_values(keys, ignore_index=True)
+
+    data, expected = canonical(data), canonical(expected)
+    same = data[keys].equals(expected[keys]) and all(
+        np.allclose(
+            data[col].astype("float64"),
+            expected[col].astype("float64"),
+            rtol=1e-5,
+            atol=1e-6,
+            equal_nan=True,
+        )
+        for col in values
+    )
+    if not same:
+        warnings.warn(
+            f"Results differ ({len(data):,} vs {len(expected):,} rows)", stacklevel=2
+        )
+    return same
+
+
+def calculate_statistics(
+    df: pd.DataFrame,
+    error_method: str = "iqr",
+    x_var="planning_year",
+    col_var="tech_type",
+    row_var="case",
+    color="model",
+):
+    """Mean and error band of `value` by the chart variables.
+
+    `error_method` is "iqr", "std" or "stderr" for rows of values, "std" or
+    "stderr" for `data.build_rollups` partial sums, and "iqr_approx" for
+    `data.build_digests` t-digests.
+    """
+    x_var = var_to_none(x_var)
+    col_var = var_to_none(col_var)
+    row_var = var_to_none(row_var)
+    color = var_to_none(color)
+
+    by = []
+    for var in [x_var, col_var, row_var, color]:
+        if var is not None and var not in by:
+            by.append(var)
+
+    if "value_count" in df.columns:
+        # Partial aggregates from build_rollups
+        if error_method not in ["std", "stderr"]:
+            raise ValueError("Rollups only support the 'std' and 'stderr' methods.")
+        sums = df.groupby(by, observed=True)[
+            ["value_sum", "value_count", "value_sumsq"]
+        ].sum()
+        n = sums["value_count"]
+        mean = sums["value_sum"] / n
+        var = (sums["value_sumsq"] - sums["value_sum"] * mean) / (n - 1)
+        spread = np.sqrt(var.clip(lower=0))
+        if error_method == "stderr":
+            spread = spread / np.sqrt(n)
+        stats = pd.DataFrame(
+            {
+                "value": mean,
+                "low_value": mean - spread,
+                "high_value": mean + spread,
+            }
+        )
+        return stats.reset_index()
+
+    if "centroid_weight" in df.columns:
+        # Per-series t-digests from build_digests
+        if error_method != "iqr_approx":
+            raise ValueError("Digests only support the 'iqr_approx' method.")
+        stats = digest_stats(df, by, [0.25, 0.75])
+        return stats.rename(
+            columns={
+                "mean": "value",
+                0.25: "low_value",
+                0.75: "high_value",
+            }
+        )
+
+    # Grouping by scenario, region, type, and hour of day
+    grouped = df.groupby(by, observed=True)["value"]
+
+    if error_method == "iqr":
+        # Calculate average, IQR-based lower and upper bound
+        quartiles = grouped.quantile([0.25, 0.75]).unstack()
+        stats = pd.DataFrame(
+            {
+                "value": grouped.mean(),
+                "low_value": quartiles[0.25],
+                "high_value": quartiles[0.75],
+            }
+        )
+    elif error_method in ["std", "stderr"]:
+        # Calculate average, std deviation or standard error-based
+        # lower and upper bound
+        spread = {"std": "std", "stderr": "sem"}[error_method]
+        moments = grouped.agg(["mean", spread])
+        stats = pd.DataFrame(
+            {
+                "value": moments["mean"],
+                "low_value": moments["mean"] - moments[spread],
+                "high_value": moments["mean"] + moments[spread],
+            }
+        )
+    else:
+        raise ValueError(
+            "Invalid error_method. Choose 'iqr', 'iqr_approx', 'std', " "or 'stderr'."
+        )
+
+    return stats.reset_index()
+
+
+def downsample_minmax(
+    data: pd.DataFrame, x_var: str, width: int, x_range=None, stacked=False
+) -> pd.DataFrame:
+    """Thin each series to its lowest and highest value per pixel along x.
+
+    `width` is the chart width in pixels and sets the number of buckets the
+    x axis is split into, so a line keeps its visible envelope with at most
+    two points per pixel. With `x_range` (the zoomed-in domain) rows inside
+    the range get `width` buckets of their own and the rest stay coarse
+    context for panning. With `stacked`, the buckets' extremes are picked on
+    the total across series and kept for every series, so stacked areas still
+    share their x values.
+    """
+    n_buckets = max(int(width), 1)
+    x = data[x_var].to_numpy(dtype="float64")
+    if len(data) == 0 or (x_range is None and len(np.unique(x)) <= 2 * n_buckets):
+        return data
+
+    def buckets(x):
+        lo, hi = np.nanmin(x), np.nanmax(x)
+        span = hi - lo if hi > lo else 1
+        bucket = np.floor((x - lo) / span * n_buckets).clip(0, n_buckets - 1)
+        if x_range is not None:
+            lo, hi = x_range
+            inside = (x >= lo) & (x <= hi)
+            span = hi - lo if hi > lo else 1
+            fine = np.floor((x - lo) / span * n_buckets).clip(0, n_buckets - 1)
+            bucket = np.where(inside, n_buckets + fine, bucket)
+        return np.nan_to_num(bucket, nan=-1).astype("int64")
+
+    def extremes(groups, values):
+        # Positions of the first and last value of each group, in value order
+        order = np.lexsort((np.nan_to_num(values, nan=-np.inf), groups))
+        groups = groups[order]
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        ends = np.r_[starts[1:] - 1, len(groups) - 1]
+        return np.union1d(order[starts], order[ends])
+
+    if stacked:
+        totals = data.groupby(x_var, observed=True)["value"].sum()
+        xs = totals.index.to_numpy(dtype="float64")
+        keep = xs[extremes(buckets(xs), totals.to_numpy(dtype="float64"))]
+        return data.loc[data[x_var].isin(keep), :]
+
+    series_cols = [c for c in data.columns if c not in [x_var, "value"]]
+    groups = buckets(x)
+    if series_cols:
+        series = data.groupby(series_cols, observed=True, sort=False).ngroup()
+        groups = series.to_numpy() * 2 * n_buckets + groups
+    keep = extremes(groups, data["value"].to_numpy(dtype="float64"))
+    return data.iloc[keep]
+
+
+def x_zoom(x_range=None) -> alt.Parameter:
+    """Pan and zoom along x, like `interactive(bind_y=False)`.
+
+    The selection is named ZOOM_PARAM so the app can read the visible range
+    and re-fetch finer data; `x_range` sets the initial view.
+    """
+    return alt.selection_interval(
+        bind="scales",
+        encodings=["x"],
+        name=ZOOM_PARAM,
+        value=Undefined if x_range is None else {"x": list(x_range)},
+    )
+
+
+def chart_csv(data: pd.DataFrame) -> tuple[bytes, dict]:
+    """A chart table as CSV and its Vega-Lite data format.
+
+    Float32 columns keep their shortest repr instead of the float64 digits
+    JSON rows get, and numeric, boolean and datetime columns are listed in
+    the format's `parse` so the browser types them.
+    """
+    parse = {}
+    for col, dtype in data.dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype):
+            parse[col] = "boolean"
+        elif pd.api.types.is_numeric_dtype(dtype):
+            parse[col] = "number"
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            parse[col] = "date"
+    if HAS_PYARROW:
+        # Several times faster than pandas at formatting floats
+        import pyarrow as pa
+        import pyarrow.csv
+
+        buffer = io.BytesIO()
+        pyarrow.csv.write_csv(pa.Table.from_pandas(data, preserve_index=False), buffer)
+        body = buffer.getvalue()
+    else:
+        body = data.to_csv(index=False, date_format="%Y-%m-%dT%H:%M:%S").encode()
+    return body, {"type": "csv", "parse": parse}
+
+
+def _serve_chart_data(request):
+    "Session route handler for the datasets kept by `session_csv`"
+    session = get_current_session().root_scope()
+    entry = _chart_data.get(session.id, {}).get(request.query_params.get("key"))
+    if entry is None:
+        return Response(status_code=404)
+    body = entry[0]
+    headers = {"Cache-Control": "private, max-age=3600"}
+    # Compress for the network, but not in the browser (shinylive), where
+    # there is none and the service worker passes the bytes through as-is
+    if sys.platform != "emscripten" and "gzip" in request.headers.get(
+        "accept-encoding", ""
+    ):
+        body = gzip.compress(body, compresslevel=1)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, media_type="text/csv", headers=headers)
+
+
+def session_csv(data, max_rows: int = None):
+    """Altair data transformer serving DataFrames from the current session.
+
+    The spec references the data by URL instead of carrying JSON rows, so
+    `to_dict` neither writes nor validates them. Each session keeps its last
+    CHART_DATA_MAX_ENTRIES datasets, keyed by content. Outside a session, and
+    for data that isn't a DataFrame, it falls back to the default transformer.
+    """
+    session = get_current_session()
+    if session is None or not isinstance(data, pd.DataFrame):
+        return default_data_transformer(data, max_rows=max_rows)
+    session = session.root_scope()
+    key = frame_fingerprint(data)
+    if session.id not in _chart_data:
+        _chart_data[session.id] = OrderedDict()
+        session.on_ended(lambda: _chart_data.pop(session.id, None))
+    served = _chart_data[session.id]
+    if key not in served:
+        served[key] = chart_csv(data)
+    served.move_to_end(key)
+    data_format = served[key][1]
+    while len(served) > CHART_DATA_MAX_ENTRIES:
+        served.popitem(last=False)
+    url = session.dynamic_route("chart_data", _serve_chart_data)
+    return {"url": f"{url}&key={key}", "format": data_format}
+
+
+def inline_csv(data, max_rows: int = None):
+    "Altair data transformer inlining DataFrames as CSV text, for vl-convert"
+    if not isinstance(data, pd.DataFrame):
+        return default_data_transformer(data, max_rows=max_rows)
+    body, data_format = chart_csv(data)
+    return {"values": body.decode(), "format": data_format}
+
+
+def _fingerprint_data(data, max_rows: int = None):
+    # Stands in for the data when hashing a spec
+    if not isinstance(data, pd.DataFrame):
+        return default_data_transformer(data, max_rows=max_rows)
+    return {"url": frame_fingerprint(data)}
+
+
+alt.data_transformers.register("session_csv", session_csv)
+alt.data_transformers.register("inline_csv", inline_csv)
+alt.data_transformers.register("fingerprint", _fingerprint_data)
+
+
+def spec_hash(chart: alt.TopLevelMixin) -> str:
+    "Hash of a chart's spec, with each DataFrame standing in by its fingerprint"
+    with alt.data_transformers.enable("fingerprint"):
+        spec = chart_spec(chart, validate=False)
+    return hashlib.blake2b(
+        json.dumps(spec, sort_keys=True).encode(), digest_size=16
+    ).hexdigest()
+
+
+def _vegalite_to_image(spec: dict, fmt: str, scale: float) -> str | bytes:
+    import vl_convert as vlc
+
+    if fmt == "svg":
+        return vlc.vegalite_to_svg(spec)
+    return vlc.vegalite_to_png(spec, scale=scale)
+
+
+def _static_pool() -> ProcessPoolExecutor:
+    global _static_executor
+    if _static_executor is None:
+        # Forking would copy the server's threads and open sockets
+        _static_executor = ProcessPoolExecutor(
+            STATIC_RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _static_executor
+
+
+async def render_static(
+    chart: alt.TopLevelMixin, fmt: str = STATIC_CHART_FORMAT, scale: float = 1
+) -> str | bytes:
+    """Render a chart on the server with vl-convert, as SVG text or PNG bytes.
+
+    The spec is built here, since data transformers are process-wide, and
+    drawn in a worker process while the event loop serves other sessions.
+    Images are memoized by spec hash, so the same chart of the same data is
+    only drawn once per process.
+    """
+    global _static_cache_bytes
+
+    if fmt not in ["svg", "png"]:
+        raise ValueError(f"Invalid format {fmt!r}. Choose 'svg' or 'png'.")
+    key = (spec_hash(chart), fmt, scale)
+    if key in _static_cache:
+        _static_cache.move_to_end(key)
+        return _static_cache[key][0]
+    with alt.data_transformers.enable("inline_csv"):
+        spec = chart_spec(chart)
+    image = await asyncio.get_running_loop().run_in_executor(
+        _static_pool(), _vegalite_to_image, spec, fmt, scale
+    )
+
+    size = sys.getsizeof(image)
+    if size <= STATIC_CACHE_MAX_BYTES and key not in _static_cache:
+        _static_cache[key] = (image, size)
+        _static_cache_bytes += size
+        while (
+            len(_static_cache) > STATIC_CACHE_MAX_ENTRIES
+            or _static_cache_bytes > STATIC_CACHE_MAX_BYTES
+        ):
+            _, (_, evicted_size) = _static_cache.popitem(last=False)
+            _static_cache_bytes -= evicted_size
+    return image
+
+
+async def static_chart(chart: alt.TopLevelMixin, fmt: str = STATIC_CHART_FORMAT):
+    "Widget showing `render_static(chart)`, for a `render_altair` output"
+    import ipywidgets
+
+    image = await render_static(chart, fmt)
+    if fmt == "png":
+        image = (
+            '<img style="max-width: 100%" src="data:image/png;base64,'
+            f'{base64.b64encode(image).decode()}">'
+        )
+    return ipywidgets.HTML(image)
+
+
+def _remember_spec(chart: alt.TopLevelMixin, template: dict) -> None:
+    # Only for as long as `chart` lives; copies Altair makes (`.properties()`,
+    # `.interactive()`, ...) are new objects and convert in full
+    key = id(chart)
+    _chart_specs[key] = (
+        weakref.ref(chart, lambda _: _chart_specs.pop(key, None)),
+        template,
+    )
+
+
+def chart_spec(chart: alt.TopLevelMixin, validate: bool = True) -> dict:
+    """`chart.to_dict()` with the active data transformer.
+
+    Charts returned by `memoize_spec` builders reuse the spec validated when
+    they were built and only pass their DataFrame through the transformer.
+    """
+    entry = _chart_specs.get(id(chart))
+    if entry is not None and entry[0]() is chart:
+        _spec_cache_counts["spec_reuses"] += 1
+        spec = {**entry[1]}
+        data = alt.data_transformers.get()(chart.data)
+        if (
+            alt.data_transformers.consolidate_datasets
+            and isinstance(data, dict)
+            and "values" in data
+            and "name" not in data
+        ):
+            # Inline values move to the top-level datasets, as in to_dict
+            values = data["values"]
+            name = (
+                "data-"
+                + hashlib.sha256(
+                    json.dumps(values, sort_keys=True, default=str).encode()
+                ).hexdigest()[:32]
+            )
+            spec["datasets"] = {**spec.get("datasets", {}), name: values}
+            data = {"name": name, **{k: v for k, v in data.items() if k != "values"}}
+        spec["data"] = data
+        return spec
+    _spec_cache_counts["spec_conversions"] += 1
+    return chart.to_dict(validate=validate)
+
+
+def memoize_spec(chart_fn):
+    """Memoize a chart builder on its data's fingerprint and its arguments.
+
+    A hit returns the chart built before, in any session, without building
+    it again, so callers must not modify it in place (Altair's methods return
+    copies). Its validated spec is kept for `chart_spec`. `spec_cache_info`
+    has the hit and miss counts, which are also logged at debug level.
+    """
+    signature = inspect.signature(chart_fn)
+
+    @functools.wraps(chart_fn)
+    def wrapper(data, *args, **kwargs):
+        global _spec_cache_bytes
+
+        if not isinstance(data, pd.DataFrame):
+            return chart_fn(data, *args, **kwargs)
+        arguments = signature.bind(data, *args, **kwargs)
+        arguments.apply_defaults()
+        key = (
+            chart_fn.__qualname__,
+            repr([(k, v) for k, v in arguments.arguments.items() if k != "data"]),
+            frame_fingerprint(data),
+        )
+        if key in _spec_cache:
+            _spec_cache_counts["hits"] += 1
+            _spec_cache.move_to_end(key)
+            logger.debug("Chart spec cache hit in %s: %s", key[0], spec_cache_info())
+            return _spec_cache[key][0]
+        _spec_cache_counts["misses"] += 1
+        logger.debug("Chart spec cache miss in %s: %s", key[0], spec_cache_info())
+
+        chart = chart_fn(data, *args, **kwargs)
+        with alt.data_transformers.enable("fingerprint"):
+            template = chart.to_dict()
+        # Builders set the data once at the top level; anything else is
+        # returned as built, without memoizing
+        if chart.data is not data or template.get("data") != {
+            "url": frame_fingerprint(data)
+        }:
+            return chart
+        _remember_spec(chart, template)
+        # Each chart holds its DataFrame
+        size = int(data.memory_usage(deep=True).sum())
+        if size <= SPEC_CACHE_MAX_BYTES:
+            _spec_cache[key] = (chart, size)
+            _spec_cache_bytes += size
+            while (
+                len(_spec_cache) > SPEC_CACHE_MAX_ENTRIES
+                or _spec_cache_bytes > SPEC_CACHE_MAX_BYTES
+            ):
+                _, (_, evicted_size) = _spec_cache.popitem(last=False)
+                _spec_cache_bytes -= evicted_size
+        return chart
+
+    return wrapper
+
+
+def spec_cache_info() -> dict:
+    """Chart spec cache counts: builder hits and misses, specs reused or
+    converted in full by `chart_spec`, and the entries and bytes held"""
+    return {
+        **_spec_cache_counts,
+        "entries": len(_spec_cache),
+        "bytes": _spec_cache_bytes,
+    }
+
+
+@memoize_spec
 def chart_total_line(
     data: pd.DataFrame,
     x_var="planning_year",
@@ -123,6 +915,7 @@ def chart_total_line(
     dash=None,
     points=True,
     interactive_zoom=False,
+    zoom_range=None,
     interpolate="linear",
     tension=0.75,
     legend_selection_fields=None,
@@ -131,7 +924,7 @@ def chart_total_line(
     width=alt.Step(40),
     height=200,
 ) -> alt.Chart:
-    alt.data_transformers.disable_max_rows()
+    alt.data_transformers.enable(CHART_DATA_TRANSFORMER, max_rows=None)
     alt.renderers.enable("svg")
     x_var = var_to_none(x_var)
     col_var = var_to_none(col_var)
@@ -150,8 +943,10 @@ def chart_total_line(
     # selection_fields = [f for f in legend_selection_fields if f is not None]
     # selection = alt.selection_point(fields=selection_fields or [], bind="legend")
 
+    # Layers leave out the data and share it from the top-level layer, so
+    # it's converted once and sent as one named dataset
     chart = (
-        alt.Chart(data)
+        alt.Chart()
         .mark_line(
             point=dash is None and points, interpolate=interpolate, tension=tension
         )
@@ -170,7 +965,7 @@ def chart_total_line(
         chart = chart.encode(strokeDash=dash)
         if points:
             points_chart = (
-                alt.Chart(data)
+                alt.Chart()
                 .mark_point(filled=True)
                 .encode(
                     x=alt.X(x_var),
@@ -184,12 +979,14 @@ def chart_total_line(
                 # .interactive()
             )
             chart = chart + points_chart  # .resolve_scale(strokeDash="independent")
+    chart = chart.properties(data=data)
     if interactive_zoom:
-        chart = chart.interactive(bind_y=False)
+        chart = chart.add_params(x_zoom(zoom_range))
     chart = config_chart_row_col(chart, row_var, col_var)
     return chart
 
 
+@memoize_spec
 def chart_error_line(
     data: pd.DataFrame,
     x_var="planning_year",
@@ -205,7 +1002,7 @@ def chart_error_line(
     width=alt.Step(40),
     height=200,
 ) -> alt.Chart:
-    alt.data_transformers.disable_max_rows()
+    alt.data_transformers.enable(CHART_DATA_TRANSFORMER, max_rows=None)
     alt.renderers.enable("svg")
     x_var = var_to_none(x_var)
     col_var = var_to_none(col_var)
@@ -224,8 +1021,10 @@ def chart_error_line(
     # selection_fields = [f for f in legend_selection_fields if f is not None]
     # selection = alt.selection_point(fields=selection_fields or [], bind="legend")
 
+    # Layers leave out the data and share it from the top-level layer, so
+    # it's converted once and sent as one named dataset
     lines = (
-        alt.Chart(data)
+        alt.Chart()
         .mark_line(point=dash is None)
         .encode(
             x=alt.X(x_var),
@@ -245,7 +1044,7 @@ def chart_error_line(
         ]
     )
     band = (
-        alt.Chart(data)
+        alt.Chart()
         .mark_errorband(borders=True)
         .encode(
             x=alt.X(x_var),
@@ -258,12 +1057,13 @@ def chart_error_line(
     )
     # if dash is not None:
     #     band.encode(strokeDash=dash)
-    chart = lines + band
+    chart = alt.layer(lines, band, data=data)
 
     chart = config_chart_row_col(chart, row_var, col_var)
     return chart
 
 
+@memoize_spec
 def chart_total_stacked_area(
     data: pd.DataFrame,
     x_var="planning_year",
@@ -271,13 +1071,14 @@ def chart_total_stacked_area(
     row_var="case",
     color="model",
     interactive_zoom=False,
+    zoom_range=None,
     legend_selection_fields=None,
     order=None,
     scale="linear",
     width=alt.Step(40),
     height=200,
 ) -> alt.Chart:
-    alt.data_transformers.disable_max_rows()
+    alt.data_transformers.enable(CHART_DATA_TRANSFORMER, max_rows=None)
     alt.renderers.enable("svg")
     x_var = var_to_none(x_var)
     col_var = var_to_none(col_var)
@@ -309,11 +1110,12 @@ def chart_total_stacked_area(
         # .interactive()
     )
     if interactive_zoom:
-        chart = chart.interactive(bind_y=False)
+        chart = chart.add_params(x_zoom(zoom_range))
     chart = config_chart_row_col(chart, row_var, col_var)
     return chart
 
 
+@memoize_spec
 def chart_total_bar(
     data: pd.DataFrame,
     x_var="planning_year",
@@ -327,7 +1129,7 @@ def chart_total_bar(
     width=alt.Step(40),
     height=200,
 ) -> alt.Chart:
-    alt.data_transformers.disable_max_rows()
+    alt.data_transformers.enable(CHART_DATA_TRANSFORMER, max_rows=None)
     alt.renderers.enable("svg")
     x_var = var_to_none(x_var)
     col_var = var_to_none(col_var)
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+# Higher compression keeps more centroids per group and gives tighter quantiles;
+# a digest holds at most about compression / 2 centroids
+TDIGEST_COMPRESSION = 100
+
+
+def _compress(
+    groups: np.ndarray, means: np.ndarray, weights: np.ndarray, compression: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Merge weighted points into t-digest centroids, for many groups at once.
+
+    Points are sorted within their group and binned by the k1 scale function
+    k(q) = compression / (2 pi) * asin(2q - 1), so each centroid covers at most
+    one unit of k. That keeps centroids small near the tails, where quantile
+    error matters most. Returns centroids sorted by group, then mean.
+    """
+    order = np.lexsort((means, groups))
+    groups, means, weights = groups[order], means[order], weights[order]
+
+    totals = np.bincount(groups, weights=weights)
+    offsets = np.cumsum(totals) - totals
+    q = (np.cumsum(weights) - weights / 2 - offsets[groups]) / totals[groups]
+    k = compression / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1))
+    n_buckets = int(compression // 2) + 1
+    buckets = np.floor(k + compression / 4).astype("int64").clip(0, n_buckets - 1)
+
+    keys, inverse = np.unique(groups * n_buckets + buckets, return_inverse=True)
+    centroid_weights = np.bincount(inverse, weights=weights)
+    centroid_means = np.bincount(inverse, weights=weights * means) / centroid_weights
+    return keys // n_buckets, centroid_means, centroid_weights
+
+
+def _quantiles(
+    groups: np.ndarray, means: np.ndarray, weights: np.ndarray, qs: list[float]
+) -> np.ndarray:
+    "Quantiles `qs` of each group's sorted centroids, shape (n_groups, len(qs))"
+    n_groups = groups.max() + 1 if len(groups) else 0
+    totals = np.bincount(groups, weights=weights, minlength=n_groups)
+    offsets = np.cumsum(totals) - totals
+    # Centroid midpoints on a cumulative weight axis shared by all groups
+    centers = np.cumsum(weights) - weights / 2
+    first = np.searchsorted(groups, np.arange(n_groups), side="left")
+    last = np.searchsorted(groups, np.arange(n_groups), side="right") - 1
+
+    out = np.empty((n_groups, len(qs)))
+    for j, q in enumerate(qs):
+        target = offsets + q * totals
+        hi = np.clip(np.searchsorted(centers, target), first, last)
+        lo = np.clip(hi - 1, first, last)
+        span = centers[hi] - centers[lo]
+        frac = np.divide(
+            target - centers[lo], span, out=np.zeros(n_groups), where=span > 0
+        )
+        out[:, j] = means[lo] + np.clip(frac, 0, 1) * (means[hi] - means[lo])
+    return out
+
+
+def digest(
+    df: pd.DataFrame,
+    by: list[str],
+    value: str = "value",
+    weight: str = None,
+    compression: float = TDIGEST_COMPRESSION,
+) -> pd.DataFrame:
+    """t-digest of `value` for each group of `by`.
+
+    Returns one row per centroid with the `by` columns, `centroid_mean` and
+    `centroid_weight`. Digests are built incrementally and merged the same way:
+    concatenate them (or new raw rows) and call `merge_digests`.
+    """
+    values = df[value].to_numpy(dtype="float64")
+    weights = (
+        np.ones(len(df)) if weight is None else df[weight].to_numpy(dtype="float64")
+    )
+    valid = ~np.isnan(values)
+    grouped = df.loc[valid, :].groupby(by, observed=True, dropna=False)
+    keys = grouped.size().index.to_frame(index=False)
+    groups, means, weights = _compress(
+        grouped.ngroup().to_numpy(), values[valid], weights[valid], compression
+    )
+    centroids = keys.take(groups).reset_index(drop=True)
+    centroids["centroid_mean"] = means
+    centroids["centroid_weight"] = weights
+    return centroids
+
+
+def merge_digests(
+    digests: pd.DataFrame, by: list[str], compression: float = TDIGEST_COMPRESSION
+) -> pd.DataFrame:
+    "Merge the centroids of `digests` into one digest per group of `by`"
+    return digest(
+        digests,
+        by,
+        value="centroid_mean",
+        weight="centroid_weight",
+        compression=compression,
+    )
+
+
+def digest_stats(
+    digests: pd.DataFrame,
+    by: list[str],
+    qs: list[float],
+    compression: float = TDIGEST_COMPRESSION,
+) -> pd.DataFrame:
+    """Mean and approximate quantiles for each group of `by`.
+
+    Columns are the `by` columns, `mean`, and one column per quantile in `qs`.
+    """
+    merged = merge_digests(digests, by, compression)
+    grouped = merged.groupby(by, observed=True, dropna=False, sort=True)
+    keys = grouped.size().index.to_frame(index=False)
+    groups = grouped.ngroup().to_numpy()
+    means = merged["centroid_mean"].to_numpy()
+    weights = merged["centroid_weight"].to_numpy()
+
+    stats = keys
+    stats["mean"] = np.bincount(groups, weights=means * weights) / np.bincount(
+        groups, weights=weights
+    )
+    quantiles = _quantiles(groups, means, weights, qs)
+    for j, q in enumerate(qs):
+        stats[q] = quantiles[:, j]
+    return stats
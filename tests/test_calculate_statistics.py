@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data import build_digests, build_rollups
+from plots import calculate_statistics
+
+KWARGS = dict(x_var="hour_of_day", col_var="year", row_var="region", color="type")
+BY = ["hour_of_day", "year", "region", "type"]
+
+
+def lambda_statistics(df: pd.DataFrame, error_method: str) -> pd.DataFrame:
+    "The per-group lambda aggregations calculate_statistics replaced"
+    grouped = df.groupby(BY, observed=True)
+    if error_method == "iqr":
+        stats = grouped["value"].agg(
+            value=("mean"),
+            low_value=lambda x: np.percentile(x, 25),
+            high_value=lambda x: np.percentile(x, 75),
+        )
+    elif error_method == "std":
+        stats = grouped["value"].agg(
+            value=("mean"),
+            low_value=lambda x: x.mean() - x.std(),
+            high_value=lambda x: x.mean() + x.std(),
+        )
+    else:
+        stats = grouped["value"].agg(
+            value=("mean"),
+            low_value=lambda x: x.mean() - x.sem(),
+            high_value=lambda x: x.mean() + x.sem(),
+        )
+    return stats.reset_index()
+
+
+def hourly_frame(n_days: int = 60, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n_hours = n_days * 24
+    series = pd.MultiIndex.from_product(
+        [["2030", "2040"], ["r0", "r1", "r2"], ["Solar", "Wind"]],
+        names=["year", "region", "type"],
+    ).to_frame(index=False)
+    df = series.loc[series.index.repeat(n_hours)].reset_index(drop=True)
+    for col in series.columns:
+        df[col] = df[col].astype("category")
+    df["hour_of_day"] = np.tile(np.arange(n_hours) % 24, len(series)).astype("int8")
+    df["month"] = np.tile(np.arange(n_hours) // (31 * 24) + 1, len(series)).astype(
+        "int8"
+    )
+    df["value"] = rng.lognormal(0, 1, len(df)).astype("float32")
+    return df
+
+
+@pytest.mark.parametrize("error_method", ["iqr", "std", "stderr"])
+def test_matches_lambda_aggregations(error_method):
+    df = hourly_frame()
+    stats = calculate_statistics(df, error_method, **KWARGS)
+    expected = lambda_statistics(df, error_method)
+    pd.testing.assert_frame_equal(
+        stats, expected, check_dtype=False, check_exact=False, rtol=1e-5, atol=5e-6
+    )
+
+
+@pytest.mark.parametrize("error_method", ["std", "stderr"])
+def test_rollups_match_rows(error_method):
+    df = hourly_frame()
+    rollups = build_rollups(df, dims=["year", "region", "type"])["hour_of_day"]
+    stats = calculate_statistics(rollups, error_method, **KWARGS)
+    expected = calculate_statistics(df, error_method, **KWARGS)
+    pd.testing.assert_frame_equal(
+        stats, expected, check_dtype=False, check_exact=False, rtol=1e-5, atol=5e-6
+    )
+
+
+def test_digests_give_the_iqr_columns():
+    df = hourly_frame()
+    digests = build_digests(df, dims=["year", "region", "type"])["hour_of_day"]
+    stats = calculate_statistics(digests, "iqr_approx", **KWARGS)
+    expected = calculate_statistics(df, "iqr", **KWARGS)
+    pd.testing.assert_frame_equal(
+        stats[BY], expected[BY], check_dtype=False, check_categorical=False
+    )
+    assert list(stats.columns) == list(expected.columns)
+    assert (stats["low_value"] <= stats["high_value"]).all()
+
+
+def test_invalid_methods():
+    df = hourly_frame(n_days=2)
+    with pytest.raises(ValueError):
+        calculate_statistics(df, "var", **KWARGS)
+    rollups = build_rollups(df, dims=["year", "region", "type"])["hour_of_day"]
+    with pytest.raises(ValueError):
+        calculate_statistics(rollups, "iqr", **KWARGS)
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data import add_calendar, calendar_dimension, day_calendar
+
+
+def calendar_at(times, **kwargs) -> pd.DataFrame:
+    df = pd.DataFrame({"time": np.asarray(times, dtype="float32")})
+    return add_calendar(df, **kwargs)
+
+
+def hour(day_index: int, hour_of_day: int = 0) -> int:
+    "1-based time index of an hour of a 0-based day"
+    return day_index * 24 + hour_of_day + 1
+
+
+def test_one_year_without_start_year():
+    cal = calendar_dimension(pd.Series(np.arange(1, 8761, dtype="float32")))
+    assert len(cal) == 8760
+    assert cal["hour_of_day"].tolist() == list(range(24)) * 365
+    assert cal["month"].value_counts().sort_index().tolist() == [
+        days * 24 for days in [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+    ]
+    assert cal["day"].iloc[-1] == 365
+    assert cal["week"].iloc[-1] == 53
+    assert cal["season"].iloc[0] == "winter"
+    assert cal["season"].iloc[hour(151)] == "summer"
+
+
+@pytest.mark.parametrize(
+    "start_year,month,day", [(None, 3, 60), (2023, 3, 60), (2024, 2, 60)]
+)
+def test_leap_day(start_year, month, day):
+    # Day index 59 is Feb 29 in a leap year and Mar 1 otherwise
+    out = calendar_at([hour(59, 5)], start_year=start_year)
+    assert (out.loc[0, "month"], out.loc[0, "day"]) == (month, day)
+    assert out.loc[0, "hour_of_day"] == 5
+
+
+def test_leap_year_shifts_the_rest_of_the_year():
+    out = calendar_at([hour(60), hour(365)], start_year=2024)
+    assert out["month"].tolist() == [3, 12]
+    assert out["day"].tolist() == [61, 366]
+
+
+def test_multiple_years_roll_over():
+    times = [8760, 8761, 2 * 8760, 2 * 8760 + 1]
+    out = calendar_at(times)
+    assert out["month"].tolist() == [12, 1, 12, 1]
+    assert out["day"].tolist() == [365, 1, 365, 1]
+    assert out["hour_of_day"].tolist() == [23, 0, 23, 0]
+
+    # 2024 has 366 days, so the first hour of 2025 comes a day later
+    out = calendar_at([8761, hour(366)], start_year=2024)
+    assert out["month"].tolist() == [12, 1]
+    assert out["day"].tolist() == [366, 1]
+
+
+def test_day_calendar_spans_years():
+    month, day = day_calendar(365 + 366 + 365, start_year=2023)
+    assert len(month) == len(day) == 365 + 366 + 365
+    assert (day[364], day[365], day[365 + 365], day[365 + 366]) == (365, 1, 366, 1)
+
+
+@pytest.mark.parametrize("steps_per_hour", [2, 4])
+def test_steps_per_hour(steps_per_hour):
+    times = np.arange(1, 24 * steps_per_hour * 2 + 1)
+    out = calendar_at(times, steps_per_hour=steps_per_hour)
+    expected_hours = np.tile(np.repeat(np.arange(24), steps_per_hour), 2)
+    assert out["hour_of_day"].tolist() == expected_hours.tolist()
+    assert out["day"].tolist() == [1] * (24 * steps_per_hour) + [2] * (
+        24 * steps_per_hour
+    )
+
+
+def test_missing_time_is_na():
+    out = calendar_at([np.nan, 1, np.nan])
+    for col in ["hour_of_day", "day", "week", "month", "season"]:
+        assert out[col].isna().tolist() == [True, False, True]
+    assert out["hour_of_day"].dtype == "Int8"
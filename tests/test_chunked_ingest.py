@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data import partition_results, read_files, read_files_chunked
+
+
+def results_csv(path, seed: int, n_hours: int = 10) -> str:
+    "Capacity and hourly rows, with labels that first appear late in the file"
+    rng = np.random.default_rng(seed)
+    rows = []
+    for region in ["r1", "r0"]:
+        for type_, variables in [
+            ("Solar", ["capacity", "flow"]),
+            ("Battery", ["new_capacity", "storage_level"]),
+            ("PowerLine", ["capacity", "flow"]),
+        ]:
+            for variable in variables:
+                hourly = variable in ["flow", "storage_level"]
+                for time in range(1, n_hours + 1) if hourly else [np.nan]:
+                    rows.append(
+                        {
+                            "model": "m",
+                            "scenario": f"s{seed}",
+                            "region": region,
+                            "variable": variable,
+                            "type": type_,
+                            "unit": "MWh" if hourly else "MW",
+                            "year": 2030,
+                            "time": time,
+                            "value": rng.random(),
+                        }
+                    )
+    df = pd.DataFrame(rows)
+    # An empty line, which both paths drop
+    df = pd.concat([df.iloc[:5], pd.DataFrame([{}]), df.iloc[5:]])
+    fn = path / f"results{seed}.csv"
+    df.to_csv(fn, index=False)
+    return str(fn)
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 7, 10_000])
+def test_chunked_matches_whole_file(tmp_path, chunk_rows):
+    fns = [results_csv(tmp_path, 0), results_csv(tmp_path, 1)]
+    whole = read_files(fns, workers=1)
+    expected_positions = partition_results(whole)
+
+    chunked, positions = read_files_chunked(fns, chunk_rows=chunk_rows)
+
+    pd.testing.assert_frame_equal(
+        chunked, whole.reset_index(drop=True), check_index_type=False
+    )
+    for col in whole.columns:
+        if isinstance(whole[col].dtype, pd.CategoricalDtype):
+            assert list(chunked[col].cat.categories) == list(whole[col].cat.categories)
+    assert positions.keys() == expected_positions.keys()
+    for name, expected in expected_positions.items():
+        np.testing.assert_array_equal(positions[name], expected, err_msg=name)
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from plots import downsample_minmax
+
+WIDTH = 100
+
+
+def multi_year_frame(n_hours: int = 8760, seed: int = 0) -> pd.DataFrame:
+    "A year of hours per series, far more x values than 2 * WIDTH"
+    rng = np.random.default_rng(seed)
+    series = pd.MultiIndex.from_product(
+        [["r0", "r1"], ["a", "b", "c"]], names=["region", "type"]
+    ).to_frame(index=False)
+    df = series.loc[series.index.repeat(n_hours)].reset_index(drop=True)
+    for col in series.columns:
+        df[col] = df[col].astype("category")
+    df["time"] = np.tile(np.arange(1, n_hours + 1, dtype="float32"), len(series))
+    df["value"] = rng.normal(size=len(df)).astype("float32")
+    return df[["time", "region", "type", "value"]]
+
+
+def series_extremes(df: pd.DataFrame) -> pd.DataFrame:
+    return df.groupby(["region", "type"], observed=True)["value"].agg(["min", "max"])
+
+
+def test_short_months_are_not_thinned():
+    df = multi_year_frame(n_hours=744)
+    assert downsample_minmax(df, "time", 400) is df
+
+
+def test_lines_keep_each_series_extremes():
+    df = multi_year_frame()
+    out = downsample_minmax(df, "time", WIDTH)
+    assert len(out) < len(df)
+    pd.testing.assert_frame_equal(series_extremes(out), series_extremes(df))
+    # At most the lowest and highest point per pixel per series
+    assert out.groupby(["region", "type"], observed=True).size().max() <= 2 * WIDTH
+
+    # ...and every pixel's extremes, not just the global ones
+    buckets = np.floor((df["time"] - 1) / (df["time"].max() - 1) * WIDTH)
+    buckets = buckets.clip(0, WIDTH - 1)
+    keys = ["region", "type", buckets.rename("bucket")]
+    expected = df.groupby(keys, observed=True)["value"].agg(["min", "max"])
+    kept = out.groupby(
+        ["region", "type", buckets.loc[out.index].rename("bucket")], observed=True
+    )["value"].agg(["min", "max"])
+    pd.testing.assert_frame_equal(kept, expected)
+
+
+def test_zoomed_range_is_finer():
+    df = multi_year_frame()
+    full = downsample_minmax(df, "time", WIDTH)
+    zoomed = downsample_minmax(df, "time", WIDTH, x_range=(1000, 1500))
+    inside = zoomed["time"].between(1000, 1500)
+    assert inside.sum() > full["time"].between(1000, 1500).sum()
+    pd.testing.assert_frame_equal(series_extremes(zoomed), series_extremes(df))
+
+
+@pytest.mark.parametrize("x_range", [None, (2000, 3000)])
+def test_stacked_keeps_x_aligned(x_range):
+    df = multi_year_frame()
+    df["value"] = df["value"].abs()
+    out = downsample_minmax(df, "time", WIDTH, x_range=x_range, stacked=True)
+    assert len(out) < len(df)
+    # Every series keeps the same x values, so the areas stack
+    xs = out.groupby(["region", "type"], observed=True)["time"].apply(
+        lambda s: tuple(sorted(s))
+    )
+    assert xs.nunique() == 1
+    # The stack's highest and lowest totals survive
+    totals = df.groupby("time")["value"].sum()
+    kept = out.groupby("time")["value"].sum()
+    assert kept.max() == totals.max()
+    assert kept.min() == totals.min()
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from plots import fill_idx, prep_chart_data
+
+
+def sparse_frame(n_x: int, n_series: int, n_labels: int = 10) -> pd.DataFrame:
+    "`n_series` observed (region, type) pairs out of n_labels**2, each with every x"
+    rng = np.random.default_rng(0)
+    pairs = rng.choice(n_labels**2, size=n_series, replace=False)
+    return pd.DataFrame(
+        {
+            "time": np.tile(np.arange(n_x), n_series),
+            "region": np.repeat([f"r{p // n_labels}" for p in pairs], n_x),
+            "type": np.repeat([f"t{p % n_labels}" for p in pairs], n_x),
+            "value": 1.0,
+        }
+    )
+
+
+@pytest.mark.parametrize("n_x,n_series", [(24, 5), (24, 20), (96, 20), (96, 50)])
+def test_fill_along_scales_with_observed_series(n_x, n_series):
+    df = sparse_frame(n_x, n_series)
+    # Drop the first half of the first series so there is something to fill
+    df = df.iloc[n_x // 2 :]
+    out = fill_idx(df, ["time", "region", "type"], along="time")
+    n_observed = len(df[["region", "type"]].drop_duplicates())
+    assert len(out) == n_observed * n_x
+    assert out["value"].sum() == df["value"].sum()
+
+
+def test_fill_without_along_is_the_full_product():
+    df = sparse_frame(24, 5)
+    out = fill_idx(df, ["time", "region", "type"])
+    expected = df["time"].nunique() * df["region"].nunique() * df["type"].nunique()
+    assert len(out) == expected
+    assert len(out) > len(fill_idx(df, ["time", "region", "type"], along="time"))
+
+
+def test_fill_along_adds_zeros_for_missing_x():
+    df = pd.DataFrame(
+        {"time": [0, 1, 2, 0], "type": ["a", "a", "a", "b"], "value": [1.0, 2, 3, 4]}
+    )
+    out = fill_idx(df, ["time", "type"], along="time").sort_values(["type", "time"])
+    assert out["type"].tolist() == ["a", "a", "a", "b", "b", "b"]
+    assert out["value"].tolist() == [1.0, 2, 3, 4, 0, 0]
+
+
+@pytest.mark.parametrize("along", [None, "type"])
+def test_fill_one_key_keeps_values(along):
+    df = pd.DataFrame({"type": ["a", "b", "c"], "value": [1.0, 2, 3]})
+    out = fill_idx(df, ["type"], along=along)
+    assert len(out) == 3
+    assert out["value"].tolist() == [1.0, 2, 3]
+
+
+def test_fill_over_max_rows_warns_and_returns_input():
+    df = sparse_frame(24, 20)
+    with pytest.warns(UserWarning, match="Skipped zero-filling"):
+        out = fill_idx(df, ["time", "region", "type"], max_rows=len(df) - 1)
+    assert out is df
+
+
+def test_prep_chart_data_one_key():
+    df = pd.DataFrame(
+        {
+            "type": pd.Categorical(["a", "b", "a", "b"]),
+            "value": np.full(4, 1.5, dtype="float32"),
+        }
+    )
+    data = prep_chart_data(
+        df, x_var="None", col_var="None", row_var="None", color="type", engine="pandas"
+    )
+    assert data["value"].tolist() == [3.0, 3.0]
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+import plots
+from plots import downsample_minmax, frame_fingerprint, prep_chart_data
+
+
+def hourly_frame() -> pd.DataFrame:
+    n = 744 * 6
+    return pd.DataFrame(
+        {
+            "time": np.tile(np.arange(744, dtype="float32"), 6),
+            "type": pd.Categorical(np.repeat(list("abcdef"), 744)),
+            "value": np.random.default_rng(0).random(n).astype("float32"),
+        }
+    )
+
+
+def chart_data(df):
+    return prep_chart_data(
+        df, x_var="time", col_var="None", row_var="None", color="type"
+    )
+
+
+def test_memoized_results_keep_their_content_hash():
+    df = hourly_frame()
+    first, second = chart_data(df), chart_data(df)
+    assert second is not first
+    fingerprint = frame_fingerprint(second)
+    plots._fingerprints.clear()
+    assert frame_fingerprint(second) == fingerprint == frame_fingerprint(first)
+
+
+def test_derived_frames_get_their_own_hash():
+    data = chart_data(hourly_frame())
+    thinned = downsample_minmax(data, "time", width=100)
+    assert len(thinned) < len(data)
+    assert frame_fingerprint(thinned) != frame_fingerprint(data)
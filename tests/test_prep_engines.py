@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from plots import prep_chart_data
+
+KEYS = ["time", "tech_type", "case", "model"]
+
+
+def results_frame(n: int = 2_000, seed: int = 0) -> pd.DataFrame:
+    """Chart input with NaN keys, NaN values, unused categories and a
+    non-categorical label column"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "time": rng.integers(1, 25, n).astype("float32"),
+            "tech_type": pd.Categorical(
+                rng.choice(["gas", "solar", "wind"], n),
+                categories=["coal", "gas", "hydro", "solar", "wind"],
+            ),
+            "case": pd.Categorical(rng.choice(["base", "high", None], n)),
+            "model": rng.choice(["GenX", "TEMOA", None], n).astype(object),
+            "hour_of_day": rng.integers(0, 24, n).astype("int8"),
+            "value": rng.normal(100, 30, n).astype("float32"),
+        }
+    )
+    df.loc[rng.random(n) < 0.05, "time"] = np.nan
+    df.loc[rng.random(n) < 0.05, "value"] = np.nan
+    return df
+
+
+def key_args(keys: list[str]) -> dict:
+    "prep_chart_data arguments grouping by `keys`, the first one as x"
+    args = dict(zip(["x_var", "col_var", "row_var", "color"], keys))
+    return {
+        var: args.get(var, "None") for var in ["x_var", "col_var", "row_var", "color"]
+    }
+
+
+def assert_engines_match(df: pd.DataFrame, **kwargs):
+    expected = prep_chart_data(df, engine="pandas", **kwargs)
+    data = prep_chart_data(df, engine="numpy", **kwargs)
+    pd.testing.assert_frame_equal(data, expected, rtol=1e-5)
+
+
+@pytest.mark.parametrize("n_keys", range(1, len(KEYS) + 1))
+@pytest.mark.parametrize("first", KEYS)
+def test_sum_matches_pandas(n_keys, first):
+    keys = [first] + [k for k in KEYS if k != first][: n_keys - 1]
+    assert_engines_match(results_frame(), **key_args(keys))
+
+
+@pytest.mark.parametrize("n_keys", range(1, len(KEYS) + 1))
+def test_mean_matches_pandas(n_keys):
+    keys = KEYS[1:n_keys]
+    assert_engines_match(results_frame(), **key_args(keys), avg_by="hour_of_day")
+
+
+@pytest.mark.parametrize("n_keys", range(1, len(KEYS) + 1))
+def test_rollup_matches_pandas(n_keys):
+    df = results_frame()
+    rollup = (
+        df.assign(value_count=df["value"].notna().astype("int64"))
+        .groupby(KEYS + ["hour_of_day"], observed=True, dropna=False)
+        .agg(value_sum=("value", "sum"), value_count=("value_count", "sum"))
+        .reset_index()
+    )
+    keys = KEYS[1:n_keys]
+    assert_engines_match(rollup, **key_args(keys), avg_by="hour_of_day")
+
+
+def test_unused_categories_are_kept_in_dtype():
+    df = results_frame()
+    data = prep_chart_data(df, **key_args(["time", "tech_type"]), engine="numpy")
+    assert data["tech_type"].dtype == df["tech_type"].dtype
+    assert set(data["tech_type"]) == {"gas", "solar", "wind"}
@@ -0,0 +1,65 @@
+import altair as alt
+import numpy as np
+import pandas as pd
+import pytest
+
+import plots
+from plots import chart_spec, chart_total_line, chart_total_stacked_area
+
+
+def hourly_frame(seed: int = 0) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "time": np.tile(np.arange(48, dtype="float32"), 4),
+            "region": pd.Categorical(np.repeat(["r0", "r1"], 96)),
+            "type": pd.Categorical(np.tile(np.repeat(["a", "b"], 48), 2)),
+            "value": np.random.default_rng(seed).random(192).astype("float32"),
+        }
+    )
+
+
+KWARGS = dict(x_var="time", col_var="region", row_var="None", color="type")
+
+
+@pytest.mark.parametrize("builder", [chart_total_line, chart_total_stacked_area])
+@pytest.mark.parametrize("transformer", ["inline_csv", "default"])
+def test_reused_spec_equals_full_conversion(builder, transformer):
+    chart = builder(hourly_frame(), **KWARGS)
+    assert type(chart).__module__.startswith("altair.")
+    with alt.data_transformers.enable(transformer, max_rows=None):
+        assert chart_spec(chart) == chart.to_dict()
+
+
+def test_hits_return_the_built_chart():
+    df = hourly_frame(1)
+    info = plots.spec_cache_info()
+    first = chart_total_line(df, **KWARGS)
+    assert chart_total_line(df.copy(), **KWARGS) is first
+    assert chart_total_line(df, **{**KWARGS, "color": "region"}) is not first
+    after = plots.spec_cache_info()
+    assert after["hits"] == info["hits"] + 1
+    assert after["misses"] == info["misses"] + 2
+
+
+def test_copies_convert_in_full():
+    # What shinywidgets does to unfaceted charts
+    chart = chart_total_line(hourly_frame(2), **{**KWARGS, "col_var": "None"})
+    copy = chart.properties(width="container")
+    info = plots.spec_cache_info()
+    with alt.data_transformers.enable("inline_csv"):
+        spec = chart_spec(copy)
+    assert spec["width"] == "container"
+    after = plots.spec_cache_info()
+    assert after["spec_conversions"] == info["spec_conversions"] + 1
+    assert after["spec_reuses"] == info["spec_reuses"]
+
+
+def test_cache_is_bounded_by_bytes(monkeypatch):
+    monkeypatch.setattr(plots, "_spec_cache", plots.OrderedDict())
+    monkeypatch.setattr(plots, "_spec_cache_bytes", 0)
+    size = int(hourly_frame().memory_usage(deep=True).sum())
+    monkeypatch.setattr(plots, "SPEC_CACHE_MAX_BYTES", 2 * size)
+    for seed in range(4):
+        chart_total_line(hourly_frame(10 + seed), **KWARGS)
+    assert len(plots._spec_cache) == 2
+    assert plots.spec_cache_info()["bytes"] == 2 * size
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tdigest import TDIGEST_COMPRESSION, digest, digest_stats, merge_digests
+
+# Quartile error allowed, as a fraction of each group's exact IQR
+QUANTILE_TOLERANCE = 0.01
+QS = [0.25, 0.5, 0.75]
+
+
+def grouped_frame(dist: str, n: int = 20_000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    values = {
+        "uniform": lambda: rng.uniform(0, 1, 4 * n),
+        "lognormal": lambda: rng.lognormal(0, 1, 4 * n),
+        "exponential": lambda: rng.exponential(1, 4 * n),
+    }[dist]()
+    return pd.DataFrame({"g": np.repeat(list("abcd"), n), "value": values})
+
+
+def exact_quantiles(df: pd.DataFrame) -> pd.DataFrame:
+    return df.groupby("g")["value"].quantile(QS).unstack()
+
+
+def relative_error(stats: pd.DataFrame, exact: pd.DataFrame) -> float:
+    stats = stats.set_index("g")[QS]
+    iqr = exact[0.75] - exact[0.25]
+    return (stats - exact).abs().div(iqr, axis=0).to_numpy().max()
+
+
+@pytest.mark.parametrize("dist", ["uniform", "lognormal", "exponential"])
+def test_quartiles_match_percentile(dist):
+    df = grouped_frame(dist)
+    stats = digest_stats(digest(df, ["g"]), ["g"], QS)
+    assert relative_error(stats, exact_quantiles(df)) < QUANTILE_TOLERANCE
+    np.testing.assert_allclose(
+        stats["mean"], df.groupby("g")["value"].mean(), rtol=1e-12
+    )
+
+
+@pytest.mark.parametrize("dist", ["uniform", "lognormal"])
+def test_merged_digests_match_whole_digest(dist):
+    df = grouped_frame(dist)
+    parts = pd.concat([digest(df.iloc[i::3], ["g"]) for i in range(3)])
+    merged = digest_stats(parts, ["g"], QS)
+    whole = digest_stats(digest(df, ["g"]), ["g"], QS)
+    assert relative_error(merged, exact_quantiles(df)) < QUANTILE_TOLERANCE
+    assert relative_error(merged, whole.set_index("g")[QS]) < QUANTILE_TOLERANCE
+    np.testing.assert_allclose(merged["mean"], whole["mean"], rtol=1e-12)
+    pd.testing.assert_frame_equal(
+        merge_digests(parts, ["g"]).groupby("g")["centroid_weight"].sum().reset_index(),
+        digest(df, ["g"]).groupby("g")["centroid_weight"].sum().reset_index(),
+    )
+
+
+def test_empty_frame():
+    df = pd.DataFrame(
+        {"g": pd.Series([], dtype=str), "value": pd.Series([], dtype="float32")}
+    )
+    stats = digest_stats(digest(df, ["g"]), ["g"], QS)
+    assert stats.empty
+    assert list(stats.columns) == ["g", "mean", *QS]
+
+
+def test_all_nan_and_single_value_groups():
+    df = pd.DataFrame(
+        {
+            "g": pd.Categorical(["nan", "nan", "one", "two", "two"]),
+            "value": [np.nan, np.nan, 3.0, 1.0, np.nan],
+        }
+    )
+    stats = digest_stats(digest(df, ["g"]), ["g"], QS).set_index("g")
+    # All-NaN groups have no centroids, so no statistics
+    assert list(stats.index) == ["one", "two"]
+    assert (stats.loc["one"] == 3.0).all()
+    assert (stats.loc["two"] == 1.0).all()
+
+
+@pytest.mark.parametrize("compression", [20, TDIGEST_COMPRESSION, 300])
+def test_centroid_count_is_bounded(compression):
+    df = grouped_frame("lognormal")
+    bound = compression // 2 + 1
+    digests = digest(df, ["g"], compression=compression)
+    assert digests.groupby("g").size().max() <= bound
+    # Merging many digests compresses back under the same bound
+    parts = pd.concat(
+        [digest(df.iloc[i::10], ["g"], compression=compression) for i in range(10)]
+    )
+    merged = merge_digests(parts, ["g"], compression=compression)
+    assert merged.groupby("g").size().max() <= bound
+    assert merged["centroid_weight"].sum() == len(df)